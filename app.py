@@ -1,29 +1,161 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g, stream_with_context
 import random
 from flask_cors import CORS
+import click
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 import os
 import sys
 import jwt
+import json
+import logging
+import atexit
+import shutil
+import tempfile
+import time
+from urllib.parse import urlencode
 from functools import wraps
+from collections import namedtuple
+import numpy as np
+import pandas as pd
 
 # Ensure src module can be found
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), 'src')))
 
 app = Flask(__name__)
-CORS(app, resources={r"/api/*": {"origins": "*"}}) # Allow all origins for development
+# Allow all origins for development; paging headers are readable cross-origin
+CORS(app, resources={r"/api/*": {"origins": "*"}}, expose_headers=['X-Next-Cursor', 'Link'])
 
 # Database Configuration
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cardio.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = 'dev-secret-key' # Change for production
 
+# Prediction cache: entries per worker, seconds to live, and an optional
+# SQLite file shared by all workers on the host (disabled when empty)
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+app.config['PREDICTION_CACHE_TTL'] = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))
+app.config['PREDICTION_CACHE_SHARED_PATH'] = os.environ.get('PREDICTION_CACHE_SHARED_PATH', '')
+
+# Micro-batching for threaded workers (e.g. gunicorn --threads): concurrent
+# /api/predict calls are scored together, up to MICRO_BATCH_SIZE rows per
+# batch, waiting at most MICRO_BATCH_WAIT_US microseconds for more rows.
+# A batch size near the worker's thread count works best.
+app.config['MICRO_BATCHING'] = os.environ.get('MICRO_BATCHING', '0') == '1'
+app.config['MICRO_BATCH_SIZE'] = int(os.environ.get('MICRO_BATCH_SIZE', 16))
+app.config['MICRO_BATCH_WAIT_US'] = float(os.environ.get('MICRO_BATCH_WAIT_US', 200))
+
+# Model registry (see src/registry.py): seconds between checks of its CURRENT
+# pointer (0 disables hot reload), and whether to shadow-score requests with
+# the CANDIDATE model
+app.config['MODEL_REGISTRY_DIR'] = os.environ.get('MODEL_REGISTRY_DIR', 'models/registry')
+app.config['MODEL_RELOAD_INTERVAL'] = float(os.environ.get('MODEL_RELOAD_INTERVAL', 5))
+app.config['SHADOW_MODE'] = os.environ.get('SHADOW_MODE', '0') == '1'
+
+# Evaluate single predictions with Python source generated from the model
+# (see src/model.py), cached as a .py file next to the model file
+app.config['MODEL_CODEGEN'] = os.environ.get('MODEL_CODEGEN', '1') == '1'
+
+# Write-behind persistence: queue Prediction rows of /api/predict and insert
+# them in batches of up to PREDICTION_FLUSH_SIZE rows, at most
+# PREDICTION_FLUSH_INTERVAL seconds after they were queued. SQLITE_WAL puts
+# the database in WAL mode so history reads do not wait for writes.
+app.config['PREDICTION_WRITE_BEHIND'] = os.environ.get('PREDICTION_WRITE_BEHIND', '0') == '1'
+app.config['PREDICTION_FLUSH_SIZE'] = int(os.environ.get('PREDICTION_FLUSH_SIZE', 500))
+app.config['PREDICTION_FLUSH_INTERVAL'] = float(os.environ.get('PREDICTION_FLUSH_INTERVAL', 0.5))
+app.config['SQLITE_WAL'] = os.environ.get('SQLITE_WAL', '0') == '1'
+
+# Verified-token cache: entries per worker and seconds to live (capped by the token's exp)
+app.config['TOKEN_CACHE_SIZE'] = int(os.environ.get('TOKEN_CACHE_SIZE', 10_000))
+app.config['TOKEN_CACHE_TTL'] = float(os.environ.get('TOKEN_CACHE_TTL', 300))
+# Seconds a worker may keep serving cached tokens of a user changed by another worker
+app.config['TOKEN_REVOCATION_POLL'] = float(os.environ.get('TOKEN_REVOCATION_POLL', 2))
+
+# Fraction of requests logged as structured JSON events (errors are always logged)
+app.config['REQUEST_LOG_SAMPLE_RATE'] = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 0.01))
+
 db = SQLAlchemy(app)
 
+# --- INSTRUMENTATION ---
+# Latency histograms and counters of this worker, served on /metrics
+from src.metrics import REGISTRY as metrics_registry, SampledLog, StageTimer
+
+REQUEST_SECONDS = metrics_registry.histogram(
+    'cardio_http_request_seconds', 'Time to build each API response (to first byte when streamed).',
+    ['endpoint', 'status']
+)
+PREDICT_STAGE_SECONDS = metrics_registry.histogram(
+    'cardio_predict_stage_seconds', 'Time spent in each stage of /api/predict.', ['stage']
+)
+AUTH_SECONDS = metrics_registry.histogram(
+    'cardio_auth_seconds', 'Time token_required takes to authenticate a request.', ['result']
+)
+QUERY_SECONDS = metrics_registry.histogram(
+    'cardio_db_query_seconds', 'Time of the history and stats database queries.', ['query']
+)
+PREDICTIONS = metrics_registry.counter(
+    'cardio_predictions_total', 'Predictions served by /api/predict and /api/predict/batch.',
+    ['model_version', 'category']
+)
+
+# One JSON event per line from the API ('cardio.requests') and the src
+# modules it runs ('cardio.model', ...)
+event_logger = logging.getLogger('cardio')
+if not event_logger.handlers:
+    event_logger.addHandler(logging.StreamHandler(sys.stdout))
+    event_logger.setLevel(logging.INFO)
+    event_logger.propagate = False
+request_log = SampledLog(logging.getLogger('cardio.requests'), rate=app.config['REQUEST_LOG_SAMPLE_RATE'])
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def observe_request(response):
+    start = g.get('request_start')
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, request.endpoint or 'unknown', response.status_code)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+from src.cache import TokenCache
+
+# What authenticated routes get as current_user: enough to identify the user
+# without keeping an ORM object (and its session) alive in the cache
+UserRecord = namedtuple('UserRecord', 'id name email')
+
+def poll_token_revocations(cursor):
+    """
+    Ids of the users changed since revocation `cursor`, and the next cursor.
+    The first poll starts from the latest revocation: the cache is empty.
+    """
+    if cursor is None:
+        latest = db.session.execute(db.select(db.func.max(TokenRevocation.id))).scalar()
+        return (), latest or 0
+    rows = db.session.execute(
+        db.select(TokenRevocation.id, TokenRevocation.user_id).where(TokenRevocation.id > cursor)
+    ).all()
+    return {user_id for _, user_id in rows}, max((id for id, _ in rows), default=cursor)
+
+token_cache = TokenCache(
+    max_size=app.config['TOKEN_CACHE_SIZE'],
+    ttl=app.config['TOKEN_CACHE_TTL'],
+    poll=poll_token_revocations,
+    poll_interval=app.config['TOKEN_REVOCATION_POLL']
+)
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        start = time.perf_counter()
+
+        def authenticated(result):
+            AUTH_SECONDS.observe(time.perf_counter() - start, result)
+
         token = None
         if 'Authorization' in request.headers:
             auth_header = request.headers['Authorization']
@@ -31,24 +163,38 @@ def token_required(f):
                 token = auth_header.split(" ")[1]
         
         if not token:
+            authenticated('missing')
             return jsonify({'error': 'Token is missing!'}), 401
+
+        current_user = token_cache.get(token)
+        if current_user is not None:
+            authenticated('cached')
+            return f(current_user, *args, **kwargs)
+        generation = token_cache.generation
         
         try:
             # For simplicity with the existing "mock-token-ID", we accept that 
             # Or use real JWT. Let's support both for transition.
+            exp = None
             if token.startswith('mock-token-'):
                 user_id = token.split('-')[-1]
-                current_user = User.query.get(int(user_id))
+                user = User.query.get(int(user_id))
             else:
                 data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-                current_user = User.query.get(data['user_id'])
+                user = User.query.get(data['user_id'])
+                exp = data.get('exp')
             
-            if not current_user:
+            if not user:
+                authenticated('invalid')
                 return jsonify({'error': 'Invalid user token!'}), 401
                 
         except Exception as e:
+            authenticated('invalid')
             return jsonify({'error': f'Token is invalid: {str(e)}'}), 401
-            
+
+        current_user = UserRecord(user.id, user.name, user.email)
+        token_cache.put(token, current_user, exp, generation)
+        authenticated('verified')
         return f(current_user, *args, **kwargs)
     return decorated
 
@@ -61,7 +207,14 @@ def home():
         "endpoints": [
             "/api/auth/login", 
             "/api/auth/register", 
+            "/api/auth/cache",
             "/api/predict", 
+            "/api/predict/batch",
+            "/api/predict/queue",
+            "/api/model/cache",
+            "/api/model/registry",
+            "/api/model/batching",
+            "/metrics",
             "/api/user/history",
             "/api/user/stats"
         ]
@@ -75,7 +228,25 @@ class User(db.Model):
     password = db.Column(db.String(200), nullable=False) # In real app, use hashing
     predictions = db.relationship('Prediction', backref='user', lazy=True)
 
+class TokenRevocation(db.Model):
+    # Appended to, in the same transaction, whenever a user changes or is
+    # deleted; every worker's token cache polls for new rows
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+
+def invalidate_user_tokens(mapper, connection, user):
+    connection.execute(db.insert(TokenRevocation).values(user_id=user.id))
+    token_cache.invalidate_user(user.id)
+
+# Cached tokens of a user must not outlive a change to that user: this
+# worker drops them right away, the others within TOKEN_REVOCATION_POLL seconds
+db.event.listen(User, 'after_update', invalidate_user_tokens)
+db.event.listen(User, 'after_delete', invalidate_user_tokens)
+
 class Prediction(db.Model):
+    # History and stats read a user's predictions newest first
+    __table_args__ = (db.Index('ix_prediction_user_date', 'user_id', 'date'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     date = db.Column(db.DateTime, default=datetime.utcnow)
@@ -96,18 +267,368 @@ class Prediction(db.Model):
     # Result
     risk_score = db.Column(db.Float)
     risk_category = db.Column(db.String(20)) # Low, Medium, High
+    model_version = db.Column(db.String(32)) # Version of the model that scored it
+
+class UserStats(db.Model):
+    """
+    Per-user summary of predictions for /api/user/stats, folded forward on
+    every insert (see record_predictions) instead of re-reading the history.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_predictions = db.Column(db.Integer, nullable=False, default=0)
+
+    # Latest prediction
+    last_date = db.Column(db.DateTime)
+    last_risk_score = db.Column(db.Float)
+    last_ap_hi = db.Column(db.Integer)
+    last_ap_lo = db.Column(db.Integer)
+
+    recent_scores = db.Column(db.JSON, nullable=False, default=list) # [[iso date, score], ...] oldest first
+    monthly_scores = db.Column(db.JSON, nullable=False, default=dict) # {"YYYY-MM": [score sum, count]}
+
+    RECENT_SIZE = 6
+
+    def add(self, rows):
+        """
+        Fold Prediction rows (dicts of column values) into the summary.
+        """
+        rows = sorted(rows, key=lambda row: row['date'])
+        recent = [tuple(entry) for entry in self.recent_scores or []]
+        monthly = dict(self.monthly_scores or {})
+
+        for row in rows:
+            date, score = row['date'], row['risk_score']
+            self.total_predictions = (self.total_predictions or 0) + 1
+            if self.last_date is None or date >= self.last_date:
+                self.last_date = date
+                self.last_risk_score = score
+                self.last_ap_hi = row.get('ap_hi')
+                self.last_ap_lo = row.get('ap_lo')
+            recent.append((date.isoformat(), score))
+            month = date.strftime('%Y-%m')
+            total, count = monthly.get(month, (0.0, 0))
+            monthly[month] = [total + score, count + 1]
+
+        # Reassigned, not mutated, so the JSON columns are flagged as changed
+        self.recent_scores = [list(entry) for entry in sorted(recent)[-self.RECENT_SIZE:]]
+        self.monthly_scores = monthly
+
+# --- SCHEMA MIGRATIONS ---
+def add_missing_columns(model):
+    """
+    Lightweight migration for tables created before a column was added to
+    the model: ALTER TABLE ADD COLUMN for every column the table lacks.
+    """
+    table = model.__table__
+    existing = {column['name'] for column in db.inspect(db.engine).get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in existing:
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            print(f"Added column {table.name}.{column.name}")
+    db.session.commit()
+
+def add_missing_indexes(model):
+    """
+    Create the model's indexes that an existing table does not have yet.
+    """
+    for index in model.__table__.indexes:
+        index.create(bind=db.engine, checkfirst=True)
+
+def use_sqlite_wal(dbapi_connection, connection_record):
+    # journal_mode sticks to the database file; synchronous is per connection
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.close()
+
+with app.app_context():
+    if app.config['SQLITE_WAL'] and db.engine.dialect.name == 'sqlite':
+        db.event.listen(db.engine, 'connect', use_sqlite_wal)
+    db.create_all()
+    add_missing_columns(Prediction)
+    add_missing_indexes(Prediction)
+
+@app.cli.command('backfill-stats')
+def backfill_stats_command():
+    """Rebuild every user's stats summary from the stored predictions."""
+    rebuilt = rebuild_user_stats()
+    db.session.commit()
+    print(f"Rebuilt stats for {rebuilt} users")
 
 # --- LOAD MODEL ---
 import pickle
-from src.model import predict as model_predict # Import manual predict function
+import hashlib
+from src.model import attach_evaluator, compile_model # Flattens a trained tree or forest for vectorized predict
+from src.model_file import load_model_file
+from src.features import FEATURES, INPUTS, derive_columns, derive_row, parse_columns, parse_row
+from src.cache import PredictionCache, SharedPredictionStore
+from src.registry import CANDIDATE, CURRENT, MODEL_LOAD_SECONDS, LiveModel, ShadowScorer, watch
+from src.registry import metrics_path as registry_metrics_path
+from src.write_behind import WriteBehindQueue
+from src.batching import MicroBatcher
+
+MODEL_FILE_PATH = 'models/cardio_model.bin'
+MODEL_PICKLE_PATH = 'models/cardio_model.pkl'
+MODEL_EVALUATOR_PATH = 'models/cardio_model.py'
+
+def load_model():
+    """
+    Memory-map the compact binary model, falling back to the pickled tree.
+    Returns (model, version, header); the header is None for a pickle.
+    """
+    if os.path.exists(MODEL_FILE_PATH):
+        compiled, header = load_model_file(MODEL_FILE_PATH)
+        if header.get('features', FEATURES) != FEATURES:
+            raise ValueError(f"{MODEL_FILE_PATH} was trained on different features")
+        loaded = compiled, header['version'], header
+    else:
+        with open(MODEL_PICKLE_PATH, 'rb') as f:
+            model_bytes = f.read()
+        # Content hash of the artifact; cached predictions are tied to it
+        model = compile_model(pickle.loads(model_bytes), len(FEATURES))
+        loaded = model, hashlib.sha256(model_bytes).hexdigest()[:12], None
+
+    if app.config['MODEL_CODEGEN']:
+        attach_evaluator(loaded[0], MODEL_EVALUATOR_PATH, loaded[1])
+    return loaded
+
+def risk_category(risk_score):
+    if risk_score >= 0.5:
+        return 'High'
+    if risk_score >= 0.25:
+        return 'Medium'
+    return 'Low'
+
+# The live model follows the registry's CURRENT pointer; without a registry
+# the legacy model files are loaded once
+live_model = LiveModel(
+    app.config['MODEL_REGISTRY_DIR'], CURRENT, features=FEATURES, codegen=app.config['MODEL_CODEGEN']
+)
+live_model.refresh()
+if live_model.loaded is None:
+    load_start = time.perf_counter()
+    try:
+        live_model.loaded = load_model()
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - load_start, 'file', 'ok')
+    except Exception as e:
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - load_start, 'file', 'error')
+        print(f"Error loading model: {e}")
+if live_model.loaded is not None:
+    print(f"Model loaded successfully! (version {live_model.version})")
+
+# --- PREDICTION PERSISTENCE ---
+STATS_COLUMNS = (Prediction.user_id, Prediction.date, Prediction.risk_score, Prediction.ap_hi, Prediction.ap_lo)
 
-model = None
-try:
-    with open('models/cardio_model.pkl', 'rb') as f:
-        model = pickle.load(f)
-    print("Model loaded successfully!")
-except Exception as e:
-    print(f"Error loading model: {e}")
+def update_user_stats(rows):
+    """
+    Fold newly inserted Prediction rows into their users' summaries, in the
+    caller's transaction. Runs after the insert, which already holds
+    SQLite's write lock, so concurrent writers cannot interleave.
+    """
+    rows_by_user = {}
+    for row in rows:
+        rows_by_user.setdefault(int(row['user_id']), []).append(row)
+
+    summaries = {
+        summary.user_id: summary
+        for summary in db.session.scalars(
+            db.select(UserStats).where(UserStats.user_id.in_(rows_by_user)).with_for_update()
+        )
+    }
+    for user_id, user_rows in rows_by_user.items():
+        if user_id in summaries:
+            summaries[user_id].add(user_rows)
+
+    # Users without a summary yet may have older predictions: build theirs
+    # from the table, which already holds the new rows
+    missing = [user_id for user_id in rows_by_user if user_id not in summaries]
+    if missing:
+        rebuild_user_stats(missing)
+
+def record_predictions(rows):
+    """
+    Insert Prediction rows (dicts of column values) and update the users'
+    stats summaries. The caller commits.
+    """
+    db.session.execute(db.insert(Prediction), rows)
+    update_user_stats(rows)
+
+def rebuild_user_stats(user_ids=None):
+    """
+    Rebuild the stats summaries of `user_ids` (all users with predictions
+    when None) from their stored predictions, streaming one user's rows at
+    a time, in the caller's transaction. Returns the number of summaries.
+    """
+    query = db.select(*STATS_COLUMNS).order_by(Prediction.user_id, Prediction.date, Prediction.id)
+    delete = db.delete(UserStats)
+    if user_ids is not None:
+        query = query.where(Prediction.user_id.in_(user_ids))
+        delete = delete.where(UserStats.user_id.in_(user_ids))
+    db.session.execute(delete)
+
+    rebuilt = set()
+    summary = None
+    for row in db.session.execute(query.execution_options(yield_per=1000)):
+        if summary is None or summary.user_id != row.user_id:
+            summary = UserStats(user_id=row.user_id, total_predictions=0, recent_scores=[], monthly_scores={})
+            db.session.add(summary)
+            rebuilt.add(row.user_id)
+        summary.add([row._asdict()])
+
+    for user_id in set(user_ids or []) - rebuilt:
+        db.session.add(UserStats(user_id=user_id, total_predictions=0, recent_scores=[], monthly_scores={}))
+        rebuilt.add(user_id)
+    db.session.flush()
+    return len(rebuilt)
+
+def insert_predictions(rows):
+    with app.app_context():
+        record_predictions(rows)
+        db.session.commit()
+
+def insert_prediction(row):
+    insert_predictions([row])
+
+prediction_writer = None
+if app.config['PREDICTION_WRITE_BEHIND']:
+    prediction_writer = WriteBehindQueue(
+        insert_predictions, insert_prediction,
+        max_batch=app.config['PREDICTION_FLUSH_SIZE'],
+        max_delay=app.config['PREDICTION_FLUSH_INTERVAL']
+    )
+    # Flush whatever is still queued when the worker exits
+    atexit.register(prediction_writer.close)
+
+def save_prediction(row):
+    """
+    Persist one Prediction row (a dict of column values): queued when
+    write-behind is enabled, otherwise inserted and committed right away.
+    """
+    if prediction_writer is not None:
+        prediction_writer.put(row)
+    else:
+        record_predictions([row])
+        db.session.commit()
+
+shadow_scorer = None
+watched_models = [live_model]
+if app.config['SHADOW_MODE']:
+    candidate_model = LiveModel(app.config['MODEL_REGISTRY_DIR'], CANDIDATE, features=FEATURES)
+    candidate_model.refresh()
+    shadow_scorer = ShadowScorer(candidate_model, risk_category)
+    watched_models.append(candidate_model)
+
+def start_model_watcher():
+    if app.config['MODEL_RELOAD_INTERVAL'] > 0:
+        watch(watched_models, app.config['MODEL_RELOAD_INTERVAL'])
+
+start_model_watcher()
+# Threads do not survive fork, so workers forked from a preloaded app start their own
+os.register_at_fork(after_in_child=start_model_watcher)
+
+prediction_cache = PredictionCache(
+    max_size=app.config['PREDICTION_CACHE_SIZE'],
+    ttl=app.config['PREDICTION_CACHE_TTL'],
+    shared=SharedPredictionStore(app.config['PREDICTION_CACHE_SHARED_PATH'])
+    if app.config['PREDICTION_CACHE_SHARED_PATH'] else None
+)
+
+# Bumped when the values predict_one caches change shape
+PREDICTION_CACHE_FORMAT = 2
+
+def predict_one(loaded, features):
+    """
+    Risk probability of one feature vector under a loaded (model, version,
+    header) and its path contributions per feature (None when the model
+    cannot explain itself), memoized per model version.
+    """
+    model, version, _ = loaded
+
+    def compute():
+        if micro_batcher is not None:
+            return micro_batcher.predict(model, features)
+        return score_one(model, features)
+
+    # Shared cache files outlive deploys: tag entries with the layout of the cached values
+    return prediction_cache.get_or_compute(f"{version}/{PREDICTION_CACHE_FORMAT}", features, compute)
+
+def score_one(model, features):
+    """
+    score_rows for a single feature vector, through the model's generated
+    evaluator when it has one.
+    """
+    if not model.explainable:
+        return float(model.predict_one(features)), None
+    prediction, _, contributions = model.explain_one(features)
+    return float(prediction), contributions.tolist()
+
+def score_rows(model, X):
+    """
+    (probability, path contributions per feature or None) of every row of X.
+    """
+    if not model.explainable:
+        return [(float(p), None) for p in model.predict_batch(X)]
+    predictions, _, contributions = model.explain_batch(X)
+    return [(float(p), row) for p, row in zip(predictions.tolist(), contributions.tolist())]
+
+micro_batcher = None
+if app.config['MICRO_BATCHING']:
+    micro_batcher = MicroBatcher(
+        score_rows,
+        max_batch_size=app.config['MICRO_BATCH_SIZE'],
+        max_wait_us=app.config['MICRO_BATCH_WAIT_US']
+    )
+
+# --- EXPLANATIONS ---
+# How a feature that raised a patient's risk is shown in "factors"
+FACTOR_LABELS = {
+    'age_years': "Age Factor",
+    'gender': "Gender",
+    'weight': "Body Weight",
+    'ap_hi': "High Systolic BP",
+    'ap_lo': "High Diastolic BP",
+    'cholesterol': "Elevated Cholesterol",
+    'gluc': "Elevated Glucose",
+    'smoke': "Smoking",
+    'alco': "Alcohol Intake",
+    'active': "Physical Inactivity",
+    'bmi': "High BMI",
+    'pulse_pressure': "Wide Pulse Pressure",
+    'health_index': "Combined Risk Markers",
+}
+TOP_FACTORS = 3
+TOP_CONTRIBUTIONS = 5
+# Smallest rise in risk probability (2 points) for a feature to be shown as
+# a factor; smaller shifts come from splits near typical values
+MIN_FACTOR_SHIFT = 0.02
+
+def top_contributions(contributions):
+    """
+    [feature index, shift] of the largest shifts of one row's path, by
+    magnitude, for the "contributions" field.
+    """
+    contributions = np.asarray(contributions)
+    order = np.argsort(-np.abs(contributions), kind='stable')[:TOP_CONTRIBUTIONS]
+    return [[int(index), float(contributions[index])] for index in order if contributions[index] != 0]
+
+def explained_factors(contributions):
+    """
+    Labels of the features whose splits raised the risk most along the
+    decision path, from one row's full contribution vector.
+    """
+    return explained_factors_batch(np.asarray(contributions)[None, :])[0]
+
+def explained_factors_batch(contributions):
+    """
+    Labels of the (up to TOP_FACTORS) features that raised each row's risk
+    by at least MIN_FACTOR_SHIFT, largest first, for every row of an
+    (n_rows, n_features) contribution matrix.
+    """
+    order = np.argsort(-contributions, axis=1, kind='stable')[:, :TOP_FACTORS]
+    raising = np.take_along_axis(contributions, order, axis=1) >= MIN_FACTOR_SHIFT
+    labels = np.array([FACTOR_LABELS[name] for name in FEATURES], dtype=object)[order]
+    return [list(row_labels[row_raising]) or ["General Health Markers"] for row_labels, row_raising in zip(labels, raising)]
 
 # --- AUTH ROUTES ---
 @app.route('/api/auth/register', methods=['POST'])
@@ -138,13 +659,14 @@ def register():
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     data = request.json
-    print(f"Login attempt for email: {data.get('email')}")
     user = User.query.filter_by(email=data['email']).first()
     
     if not user:
-        print("User not found")
+        request_log.always('login_failed', reason='unknown_email')
     elif user.password != data['password']:
-        print(f"Password mismatch. Expected: {user.password}, Got: {data['password']}")
+        request_log.always('login_failed', reason='wrong_password', userId=user.id)
+    else:
+        request_log.sample('login', userId=user.id)
 
     if not user:
         return jsonify({'error': 'User not found. Please Register first.'}), 404
@@ -164,189 +686,467 @@ def login():
     })
 
 # --- MODEL METRICS ROUTES ---
+MODEL_METRICS_PATH = 'models/cardio_metrics.json'
+METRICS_CACHE_SECONDS = 60
+
+# (model version, response body, ETag) of the metrics report last read
+model_metrics = None
+
+def load_model_metrics(version):
+    """
+    Read the metrics report train.py wrote for `version`, from the registry
+    or next to the legacy model files. Returns the raw bytes, or None.
+    """
+    for path in (registry_metrics_path(app.config['MODEL_REGISTRY_DIR'], version), MODEL_METRICS_PATH):
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            continue
+        if json.loads(body).get('version') in (version, None):
+            return body
+    return None
+
+def header_metrics_report(header):
+    """
+    A minimal metrics report from the metrics stored in a model file's
+    header, for models without a report file. The charts the header has no
+    data for are left out. Returns bytes, or None.
+    """
+    metrics = (header or {}).get('metrics', {}).get('test')
+    if not metrics:
+        return None
+    return json.dumps({
+        **metrics,
+        'metrics': header['metrics'],
+        'confusionMatrix': [
+            {'actual': 'Positive', 'TP': None, 'FN': None},
+            {'actual': 'Negative', 'FP': None, 'TN': None}
+        ],
+        'version': header['version'],
+        'params': header.get('params', {}),
+        'trainedAt': header.get('trained_at')
+    }).encode('utf-8')
+
 @app.route('/api/model/metrics', methods=['GET'])
 def get_model_metrics():
-    # Mock data for visualization (would ideally come from src/train.py results)
+    """
+    The live model's metrics report, read from disk once per model version
+    and then served from memory. Clients revalidate with its ETag, so a
+    dashboard poll usually ends in a 304 without a body.
+    """
+    global model_metrics
+    loaded = live_model.loaded
+    if loaded is None:
+        return jsonify({'error': 'No metrics report for the current model; run src/train.py'}), 404
+    _, version, header = loaded
+    cached = model_metrics
+    if cached is None or cached[0] != version:
+        body = load_model_metrics(version) or header_metrics_report(header)
+        if body is None:
+            return jsonify({'error': 'No metrics report for the current model; run src/train.py'}), 404
+        cached = model_metrics = (version, body, hashlib.sha256(body).hexdigest()[:16])
+
+    _, body, etag = cached
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={METRICS_CACHE_SECONDS}'
+    return response.make_conditional(request)
+
+@app.route('/api/model/cache', methods=['GET'])
+def get_prediction_cache_stats():
+    return jsonify(prediction_cache.stats())
+
+@app.route('/api/model/batching', methods=['GET'])
+def get_micro_batching_stats():
+    if micro_batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **micro_batcher.stats()})
+
+@app.route('/api/auth/cache', methods=['GET'])
+def get_token_cache_stats():
+    return jsonify(token_cache.stats())
+
+@app.route('/api/predict/queue', methods=['GET'])
+def get_prediction_queue_stats():
+    if prediction_writer is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **prediction_writer.stats()})
+
+@app.route('/api/model/registry', methods=['GET'])
+def get_model_registry():
     return jsonify({
-        "accuracy": 0.72,
-        "precision": 0.75,
-        "recall": 0.67,
-        "f1": 0.71,
-        "confusionMatrix": [
-            {"actual": "Positive", "TP": 120, "FN": 15},
-            {"actual": "Negative", "FP": 10, "TN": 155}
-        ],
-        "trainingHistory": [
-            {"epoch": 1, "loss": 0.5, "accuracy": 0.60},
-            {"epoch": 2, "loss": 0.4, "accuracy": 0.70},
-            {"epoch": 3, "loss": 0.35, "accuracy": 0.75},
-        ],
-        "featureImportance": [
-            {"name": "Systolic BP", "value": 0.35},
-            {"name": "Age", "value": 0.25},
-            {"name": "Cholesterol", "value": 0.15},
-            {"name": "Weight", "value": 0.10},
-            {"name": "Glucose", "value": 0.08}
-        ]
+        'version': live_model.version,
+        'reloads': live_model.reloads,
+        'reloadIntervalSeconds': app.config['MODEL_RELOAD_INTERVAL'],
+        'shadow': shadow_scorer.stats() if shadow_scorer is not None else None
     })
 
 # --- PREDICTION ROUTES ---
 @app.route('/api/predict', methods=['POST'])
 def predict_route():
+    timer = StageTimer(PREDICT_STAGE_SECONDS)
     data = request.json
     user_id = data.get('userId') # Optional for guests
     
     try:
-        def safe_int(val, default=0):
-            if val is None or val == '':
-                return default
-            try:
-                return int(val)
-            except:
-                return default
-
-        def safe_float(val, default=0.0):
-            if val is None or val == '':
-                return default
-            try:
-                return float(val)
-            except:
-                return default
-
-        # Order from CardioPreprocessing.csv (excluding index and target):
-        # gender, weight, ap_hi, ap_lo, cholesterol, gluc, smoke, alco, active, 
-        # age_years, bmi, pulse_pressure, health_index, cholesterol_gluc_interaction, bmi_category
-
-        # Extract base inputs
-        age_years = safe_int(data.get('age'))
-        gender = safe_int(data.get('gender'), 1)
-        height_cm = safe_int(data.get('height'), 160)
-        weight_kg = safe_float(data.get('weight'), 70.0)
-        ap_hi = safe_int(data.get('ap_hi'), 120)
-        ap_lo = safe_int(data.get('ap_lo'), 80)
-        cholesterol = safe_int(data.get('cholesterol'), 1)
-        gluc = safe_int(data.get('gluc'), 1)
-        smoke = safe_int(data.get('smoke'), 0)
-        alco = safe_int(data.get('alco'), 0)
-        active = safe_int(data.get('active'), 1)
-
-        # Calculate Derived Features
-        # BMI
-        height_m = height_cm / 100
-        bmi = weight_kg / (height_m ** 2) if height_m > 0 else 0
-        
-        # Pulse Pressure
-        pulse_pressure = ap_hi - ap_lo
-        
-        # Health Index (Average of binary lifestyle factors)
-        # smoke (1=bad, 0=good), alco (1=bad, 0=good), active (0=bad, 1=good)
-        # Note: Dataset labels might vary, but train.py logic suggests lifestyle flags.
-        # Simple health index used in preprocessing: active - smoke - alco
-        health_index = float(active - smoke - alco)
-        
-        # Interaction
-        chol_gluc_int = cholesterol * gluc
-        
-        # BMI Category (approximate mapping)
-        if bmi < 18.5: bmi_cat = 0
-        elif bmi < 25: bmi_cat = 1
-        elif bmi < 30: bmi_cat = 2
-        else: bmi_cat = 3
-
-        # Construct final feature vector in EXACT order
-        features = [
-            gender, 
-            weight_kg, 
-            ap_hi, 
-            ap_lo, 
-            cholesterol, 
-            gluc, 
-            smoke, 
-            alco, 
-            active, 
-            age_years, 
-            bmi, 
-            pulse_pressure, 
-            health_index, 
-            chol_gluc_int, 
-            bmi_cat
-        ]
-        
-        print(f"Prediction requested. Input features: {features}")
+        # Inputs, defaults and derived features come from the shared pipeline
+        # in src/features.py, in the exact column order the model was trained on
+        inputs = parse_row(data)
+        timer.mark('parse')
+        features = derive_row(inputs)
+        timer.mark('derive')
         
+        # Read the live model once: a hot reload mid-request cannot mix versions
+        loaded = live_model.loaded
+        model_version = loaded[1]
+
         # Make prediction using the loaded model
         # Now returns a probability (0.0 to 1.0)
-        risk_score = model_predict(model, features)
-        
-        # Refined categorization
-        if risk_score >= 0.5:
-            category = 'High'
-        elif risk_score >= 0.25:
-            category = 'Medium'
-        else:
-            category = 'Low'
+        risk_score, contributions = predict_one(loaded, features)
+        category = risk_category(risk_score)
+        if shadow_scorer is not None:
+            shadow_scorer.submit(features, risk_score, model_version)
+        timer.mark('model')
         
         # Save to DB if user is logged in
         if user_id:
-            prediction = Prediction(
-                user_id=user_id,
-                age=age_years,
-                gender=gender,
-                height=height_cm,
-                weight=weight_kg,
-                ap_hi=ap_hi,
-                ap_lo=ap_lo,
-                cholesterol=cholesterol,
-                gluc=gluc,
-                smoke=smoke,
-                alco=alco,
-                active=active,
-                risk_score=round(float(risk_score) * 100, 1),
-                risk_category=category
-            )
-            db.session.add(prediction)
-            db.session.commit()
-        
-        # Calculate key factors for UI (top 3 highest impacting variables)
-        impact_factors = []
-        if ap_hi > 140: impact_factors.append("High Systolic BP")
-        if cholesterol > 1: impact_factors.append("Elevated Cholesterol")
-        if smoke == 1: impact_factors.append("Smoking")
-        if age_years > 55: impact_factors.append("Age Factor")
+            save_prediction({
+                'user_id': user_id,
+                'date': datetime.utcnow(),
+                **inputs,
+                'risk_score': round(float(risk_score) * 100, 1),
+                'risk_category': category,
+                'model_version': model_version
+            })
+            timer.mark('db')
         
-        if not impact_factors: impact_factors = ["General Health Markers"]
+        # Key factors for UI: the features whose splits raised the risk most
+        # on this patient's path through the model. Models without explanation
+        # tables fall back to fixed rules.
+        if contributions is not None:
+            impact_factors = explained_factors(contributions)
+        else:
+            impact_factors = impact_factors_batch({name: [value] for name, value in inputs.items()})[0]
+        timer.mark('explain')
 
-        return jsonify({
+        response = jsonify({
             'riskScore': f"{risk_score * 100:.1f}",
             'riskCategory': category,
             'probability': risk_score,
-            'factors': impact_factors[:3]
+            'factors': impact_factors[:3],
+            'contributions': [
+                {'feature': FEATURES[index], 'value': value}
+                for index, value in (top_contributions(contributions) if contributions is not None else [])
+            ],
+            'modelVersion': model_version
         })
+        timer.mark('serialize')
+
+        PREDICTIONS.inc(model_version, category)
+        request_log.sample(
+            'prediction', modelVersion=model_version, riskCategory=category, saved=bool(user_id),
+            stagesMs={stage: round(seconds * 1e3, 3) for stage, seconds in timer.seconds.items()}
+        )
+        return response
 
     except Exception as e:
-        print(f"Prediction Error: {e}")
+        request_log.always('prediction_error', error=str(e))
         return jsonify({'error': str(e)}), 500
 
+# --- BATCH PREDICTION ---
+BATCH_CHUNK_SIZE = 1000
+
+def risk_categories(risk_scores):
+    return np.select([risk_scores >= 0.5, risk_scores >= 0.25], ['High', 'Medium'], 'Low')
+
+def impact_factors_batch(inputs):
+    """
+    Rule-based factors for every row of a batch, used for models that carry
+    no explanation tables.
+    """
+    rules = [
+        (np.asarray(inputs['ap_hi']) > 140, "High Systolic BP"),
+        (np.asarray(inputs['cholesterol']) > 1, "Elevated Cholesterol"),
+        (np.asarray(inputs['smoke']) == 1, "Smoking"),
+        (np.asarray(inputs['age']) > 55, "Age Factor"),
+    ]
+    factors = []
+    for row in range(len(inputs['age'])):
+        row_factors = [name for mask, name in rules if mask[row]][:3]
+        factors.append(row_factors or ["General Health Markers"])
+    return factors
+
+def batch_input_chunks():
+    """
+    Return (user_id, chunks) for a batch request. The chunks are DataFrames of
+    at most BATCH_CHUNK_SIZE patients, read from an uploaded CSV file or from
+    a JSON array, either bare or as {"userId": ..., "patients": [...]}.
+    """
+    if 'file' in request.files:
+        # Flask closes uploaded files when the view returns, before the
+        # response is streamed, so spool the upload to a file we own
+        upload = tempfile.TemporaryFile()
+        shutil.copyfileobj(request.files['file'].stream, upload)
+        upload.seek(0)
+        chunks = pd.read_csv(upload, chunksize=BATCH_CHUNK_SIZE)
+        return request.form.get('userId'), chunks
+
+    data = request.get_json(silent=True)
+    user_id = None
+    if isinstance(data, dict):
+        user_id = data.get('userId')
+        data = data.get('patients')
+    if not isinstance(data, list):
+        raise ValueError('Expected a JSON array of patients or a CSV file upload')
+    chunks = (
+        pd.DataFrame.from_records(data[start:start + BATCH_CHUNK_SIZE])
+        for start in range(0, len(data), BATCH_CHUNK_SIZE)
+    )
+    return user_id, chunks
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_batch_route():
+    """
+    Score many patients in one request. Features are derived and scored a
+    chunk at a time with column operations; results stream back as NDJSON,
+    one line per patient, so memory stays flat on large uploads. For a
+    logged-in user all Prediction rows are inserted in one transaction.
+    """
+    try:
+        user_id, chunks = batch_input_chunks()
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The whole batch is scored by the model that was live when it started
+    model, model_version, _ = live_model.loaded
+
+    def generate():
+        offset = 0
+        try:
+            for df in chunks:
+                inputs = parse_columns(df)
+                features = derive_columns(inputs)
+                if model.explainable:
+                    risk_scores, _, contributions = model.explain_batch(features)
+                    factors = explained_factors_batch(contributions)
+                else:
+                    risk_scores = model.predict_batch(features)
+                    factors = impact_factors_batch(inputs)
+                categories = risk_categories(risk_scores)
+                for category, count in zip(*np.unique(categories, return_counts=True)):
+                    PREDICTIONS.inc(model_version, str(category), amount=int(count))
+                if shadow_scorer is not None:
+                    shadow_scorer.submit(features, risk_scores, model_version)
+
+                if user_id:
+                    record_predictions([
+                        {
+                            'user_id': user_id,
+                            'date': datetime.utcnow(),
+                            **{name: inputs[name][row].item() for name in INPUTS},
+                            'risk_score': round(float(risk_scores[row]) * 100, 1),
+                            'risk_category': str(categories[row]),
+                            'model_version': model_version
+                        }
+                        for row in range(len(df))
+                    ])
+
+                for row, row_factors in enumerate(factors):
+                    risk_score = float(risk_scores[row])
+                    yield json.dumps({
+                        'index': offset + row,
+                        'riskScore': f"{risk_score * 100:.1f}",
+                        'riskCategory': str(categories[row]),
+                        'probability': risk_score,
+                        'factors': row_factors,
+                        'modelVersion': model_version
+                    }) + "\n"
+                offset += len(df)
+
+            if user_id:
+                db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            request_log.always('batch_prediction_error', error=str(e), index=offset)
+            yield json.dumps({'error': str(e), 'index': offset}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# --- RE-SCORING ---
+RESCORE_CHUNK_SIZE = 10_000
+RESCORE_CHECKPOINT_PATH = os.path.join(app.instance_path, 'rescore_checkpoint.json')
+RESCORE_COLUMNS = [Prediction.id] + [getattr(Prediction, name) for name in INPUTS]
+
+def read_rescore_checkpoint(path, model_version):
+    """
+    Last Prediction id re-scored by an interrupted run for the same model, or 0.
+    """
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return 0
+    return checkpoint['lastId'] if checkpoint.get('modelVersion') == model_version else 0
+
+def write_rescore_checkpoint(path, model_version, last_id):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'modelVersion': model_version, 'lastId': last_id}, f)
+    os.replace(tmp_path, path)
+
+def rescore_predictions(model, model_version, chunk_size=RESCORE_CHUNK_SIZE,
+                        checkpoint_path=RESCORE_CHECKPOINT_PATH):
+    """
+    Re-score stored predictions made by other models. Rows are read by
+    keyset on id a chunk at a time, their features rebuilt from the stored
+    inputs and scored in one vectorized call, and the new scores written
+    back in one executemany UPDATE per chunk. The stats summaries of the
+    chunk's users are rebuilt in the same transaction, and each chunk commits
+    with a checkpoint of its last id, so an interrupted run resumes where it
+    stopped and memory stays at one chunk. Returns the number of rows updated.
+    """
+    last_id = read_rescore_checkpoint(checkpoint_path, model_version)
+    if last_id:
+        print(f"Resuming after prediction {last_id}")
+
+    updated = rebuilt = 0
+    start = time.perf_counter()
+    while True:
+        rows = db.session.execute(
+            db.select(Prediction.user_id, *RESCORE_COLUMNS)
+            .where(Prediction.id > last_id)
+            .where(db.or_(Prediction.model_version.is_(None), Prediction.model_version != model_version))
+            .order_by(Prediction.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+
+        df = pd.DataFrame(rows, columns=['user_id', 'id', *INPUTS])
+        risk_scores = model.predict_batch(derive_columns(parse_columns(df)))
+        db.session.execute(db.update(Prediction), [
+            {
+                'id': prediction_id,
+                'risk_score': round(float(risk_score) * 100, 1),
+                'risk_category': str(category),
+                'model_version': model_version
+            }
+            for prediction_id, risk_score, category
+            in zip(df['id'].tolist(), risk_scores, risk_categories(risk_scores))
+        ])
+        # Their summaries hold the old scores
+        rebuilt += rebuild_user_stats(set(df['user_id'].tolist()))
+        db.session.commit()
+
+        last_id = int(df['id'].iloc[-1])
+        write_rescore_checkpoint(checkpoint_path, model_version, last_id)
+        updated += len(rows)
+        print(f"Re-scored {updated} predictions ({updated / (time.perf_counter() - start):.0f} rows/s)")
+
+    if rebuilt:
+        print(f"Rebuilt {rebuilt} stats summaries")
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return updated
+
+@app.cli.command('rescore-predictions')
+@click.option('--chunk-size', default=RESCORE_CHUNK_SIZE, show_default=True, help='Rows read, scored and updated per transaction.')
+@click.option('--checkpoint', default=RESCORE_CHECKPOINT_PATH, show_default=True, help='File recording progress for resuming.')
+def rescore_predictions_command(chunk_size, checkpoint):
+    """Re-score stored predictions with the live model."""
+    if live_model.loaded is None:
+        raise click.ClickException('No model loaded; train one with src/train.py')
+    model, model_version, _ = live_model.loaded
+    print(f"Re-scoring predictions with model {model_version}")
+    updated = rescore_predictions(model, model_version, chunk_size, checkpoint)
+    print(f"Done: {updated} predictions re-scored")
+
+# --- HISTORY ---
+HISTORY_PAGE_SIZE = 100
+HISTORY_MAX_PAGE_SIZE = 1000
+
+def history_cursor(date, prediction_id):
+    return f"{date.isoformat()}_{prediction_id}"
+
+def parse_history_cursor(cursor):
+    """
+    (date, id) of a history cursor. A bare ISO timestamp is accepted too and
+    means "strictly older than this time".
+    """
+    date, _, prediction_id = cursor.partition('_')
+    date = datetime.fromisoformat(date)
+    return date, int(prediction_id) if prediction_id else 0
+
 @app.route('/api/user/history', methods=['GET'])
 @token_required
 def get_history(current_user):
+    """
+    One page of the user's predictions, newest first, as a JSON array.
+    ?limit= sets the page size and ?before= takes the cursor of the previous
+    page, which is returned in the X-Next-Cursor and Link headers while
+    older predictions remain. Pages are read by keyset on (date, id) through
+    the (user_id, date) index, so their cost does not grow with history size.
+    Without either parameter the whole history is streamed, as clients that
+    do not page expect.
+    """
     user_id = request.args.get('userId')
     if not user_id:
         return jsonify({'error': 'User ID required'}), 400
-        
-    predictions = Prediction.query.filter_by(user_id=current_user.id).order_by(Prediction.date.desc()).all()
-    
-    result = []
-    for p in predictions:
-        result.append({
-            'id': p.id,
-            'date': p.date.strftime('%Y-%m-%d'),
-            'type': 'Prediction',
-            'result': f"{p.risk_category} Risk",
-            'score': p.risk_score
-        })
-        
-    return jsonify(result)
+
+    paged = 'limit' in request.args or 'before' in request.args
+    try:
+        limit = min(int(request.args.get('limit', HISTORY_PAGE_SIZE)), HISTORY_MAX_PAGE_SIZE)
+        before = request.args.get('before')
+        before = parse_history_cursor(before) if before else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or before cursor'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+    if not paged:
+        limit = None
+
+    query = (
+        db.select(Prediction.id, Prediction.date, Prediction.risk_category, Prediction.risk_score)
+        .where(Prediction.user_id == current_user.id)
+        .order_by(Prediction.date.desc(), Prediction.id.desc())
+    )
+    if before is not None:
+        query = query.where(db.tuple_(Prediction.date, Prediction.id) < before)
+
+    # The last row of this page and the first of the next, if there is one
+    boundary = []
+    if limit is not None:
+        with QUERY_SECONDS.time('history_boundary'):
+            boundary = db.session.execute(
+                db.select(Prediction.date, Prediction.id)
+                .where(query.whereclause)
+                .order_by(Prediction.date.desc(), Prediction.id.desc())
+                .limit(2).offset(limit - 1)
+            ).all()
+
+    def generate():
+        yield '['
+        # Includes encoding the rows, which are fetched as the body streams
+        with QUERY_SECONDS.time('history_page'):
+            rows = db.session.execute(query.limit(limit).execution_options(yield_per=HISTORY_PAGE_SIZE))
+            for position, p in enumerate(rows):
+                yield (',' if position else '') + json.dumps({
+                    'id': p.id,
+                    'date': p.date.strftime('%Y-%m-%d'),
+                    'type': 'Prediction',
+                    'result': f"{p.risk_category} Risk",
+                    'score': p.risk_score
+                })
+        yield ']'
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    if len(boundary) == 2:
+        cursor = history_cursor(*boundary[0])
+        response.headers['X-Next-Cursor'] = cursor
+        next_query = urlencode({'userId': user_id, 'limit': limit, 'before': cursor})
+        response.headers['Link'] = f'<{request.path}?{next_query}>; rel="next"'
+    return response
 
 @app.route('/api/user/stats', methods=['GET'])
 @token_required
@@ -355,9 +1155,16 @@ def get_stats(current_user):
     if not user_id:
         return jsonify({'error': 'User ID required'}), 400
     
-    predictions = Prediction.query.filter_by(user_id=current_user.id).order_by(Prediction.date.desc()).all()
-    
-    if not predictions:
+    # A single-row lookup; users whose summary predates the table get it built once
+    with QUERY_SECONDS.time('stats'):
+        summary = db.session.get(UserStats, current_user.id)
+    if summary is None:
+        with QUERY_SECONDS.time('stats_rebuild'):
+            rebuild_user_stats([current_user.id])
+            db.session.commit()
+            summary = db.session.get(UserStats, current_user.id)
+
+    if not summary.total_predictions:
         return jsonify({
             'lastRisk': 'N/A',
             'lastHr': 'N/A',
@@ -365,18 +1172,23 @@ def get_stats(current_user):
             'riskHistory': [],
             'dailyTip': "Walking for just 30 minutes a day can reduce your risk of heart disease by 30%."
         })
-        
-    last_pred = predictions[0]
-    
-    # Calculate monthly averages for chart (simplified)
-    chart_data = [{'date': p.date.strftime('%b %d'), 'score': p.risk_score} for p in predictions[:6]][::-1]
+
+    chart_data = [
+        {'date': datetime.fromisoformat(date).strftime('%b %d'), 'score': score}
+        for date, score in summary.recent_scores
+    ]
+    monthly_averages = [
+        {'month': month, 'score': round(total / count, 1)}
+        for month, (total, count) in sorted(summary.monthly_scores.items())
+    ]
 
     return jsonify({
-        'lastRisk': f"{last_pred.risk_score}%",
-        'lastSystolic': f"{last_pred.ap_hi} mmHg",
-        'lastDiastolic': f"{last_pred.ap_lo} mmHg",
-        'totalPredictions': len(predictions),
+        'lastRisk': f"{summary.last_risk_score}%",
+        'lastSystolic': f"{summary.last_ap_hi} mmHg",
+        'lastDiastolic': f"{summary.last_ap_lo} mmHg",
+        'totalPredictions': summary.total_predictions,
         'riskHistory': chart_data,
+        'monthlyAverages': monthly_averages,
         'dailyTip': random.choice([
             "Walking for just 30 minutes a day can reduce your risk of heart disease by 30%.",
             "Replacing saturated fats with unsaturated fats can lower your cholesterol.",
@@ -388,7 +1200,5 @@ def get_stats(current_user):
     })
 
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,93 @@
+"""
+Single-row latency of the generated Python evaluator (model.load_evaluator)
+against the recursive predict on the dict tree and the NumPy predict_batch,
+on feature vectors shaped like the ones predict_route builds (a list of
+len(FEATURES) numbers). Checks first that all three agree on every row.
+
+Run from the repository root: python -m benchmarks.bench_codegen
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.dataset import load_dataset
+from src.features import FEATURES, TARGET
+from src.model import build_forest, build_tree, compile_model, load_evaluator, predict
+
+DATA_PATH = "data/processed/CardioPreprocessed.csv"
+N_ROWS = 2000
+
+
+def per_call(function, rows, repeats=5):
+    """
+    Best-of-`repeats` mean seconds per call of function(row) over `rows`.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for row in rows:
+            function(row)
+        timings.append((time.perf_counter() - start) / len(rows))
+    return min(timings)
+
+
+def main():
+    # Measure the cached import as a server sees it, even under PYTHONDONTWRITEBYTECODE
+    sys.dont_write_bytecode = False
+    X, y, _ = load_dataset(DATA_PATH, TARGET)
+    X = np.asarray(X)
+    train = np.column_stack((X, y))
+    models = {
+        "tree (depth 10)": build_tree(train, 10, 20, max_bins=255),
+        "forest (20 x depth 10)": build_forest(train, 20, 10, 20, max_bins=255, random_state=0),
+    }
+    rows = X[:N_ROWS].tolist()
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{len(FEATURES)}-feature vectors, mean time per single-row call")
+        for name, trained in models.items():
+            trees = trained if isinstance(trained, list) else [trained]
+            model = compile_model(trained, len(FEATURES))
+            path = os.path.join(directory, f"{len(trees)}.py")
+
+            start = time.perf_counter()
+            evaluator = load_evaluator(model, path, "bench")
+            generate = time.perf_counter() - start
+            start = time.perf_counter()
+            load_evaluator(model, path, "bench")
+            reload = time.perf_counter() - start
+
+            def recursive(row):
+                return sum(predict(tree, row) for tree in trees) / len(trees)
+
+            generated = np.array([evaluator.predict(row) for row in X.tolist()])
+            assert np.allclose(generated, [recursive(row) for row in X.tolist()], rtol=0, atol=1e-12)
+            assert np.allclose(generated, model.predict_batch(X), rtol=0, atol=1e-12)
+            if len(trees) == 1:
+                assert np.array_equal(generated, model.predict_batch(X))
+            model.evaluator = evaluator
+            assert all(
+                np.allclose(model.explain_one(row)[2], contributions)
+                for row, contributions in zip(rows, model.explain_batch(X[:N_ROWS])[2])
+            )
+
+            print(name)
+            print(f"  generate + import {generate * 1e3:8.1f} ms   cached import {reload * 1e3:6.1f} ms   "
+                  f"{os.path.getsize(path) / 1024:.0f} KiB of source")
+            timings = {
+                "recursive predict": per_call(recursive, rows),
+                "predict_batch (1 row)": per_call(model.predict_batch, rows),
+                "generated predict": per_call(evaluator.predict, rows),
+                "explain_one (generated)": per_call(model.explain_one, rows),
+            }
+            model.evaluator = None
+            timings["explain_one (NumPy)"] = per_call(model.explain_one, rows)
+            for label, seconds in timings.items():
+                print(f"  {label:<26} {seconds * 1e6:9.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Latency of explain_batch (prediction plus per-feature path contributions)
+against plain predict_batch, for one row and for the whole dataset.
+
+Run from the repository root: python -m benchmarks.bench_explain
+"""
+import time
+
+import numpy as np
+
+from src.dataset import load_dataset
+from src.features import FEATURES, TARGET
+from src.model import build_forest, build_tree, compile_model
+
+DATA_PATH = "data/processed/CardioPreprocessed.csv"
+N_REPEATS = 20
+
+
+def best_of(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    X, y, _ = load_dataset(DATA_PATH, TARGET)
+    X = np.asarray(X)
+    train = np.column_stack((X, y))
+    models = {
+        "tree (depth 10)": build_tree(train, 10, 20, max_bins=255),
+        "forest (20 x depth 10)": build_forest(train, 20, 10, 20, max_bins=255, random_state=0),
+    }
+
+    print(f"{'Model':<24} {'Rows':>6} {'predict_batch':>14} {'explain_batch':>14}")
+    for name, trained in models.items():
+        model = compile_model(trained, len(FEATURES))
+        predictions, bias, contributions = model.explain_batch(X)
+        assert np.allclose(bias + contributions.sum(axis=1), predictions)
+
+        for rows, repeats in ((X[:1], N_REPEATS * 50), (X, N_REPEATS)):
+            predict = best_of(lambda: model.predict_batch(rows), repeats)
+            explain = best_of(lambda: model.explain_batch(rows), repeats)
+            print(f"{name:<24} {len(rows):>6} {predict * 1e3:>11.3f} ms {explain * 1e3:>11.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
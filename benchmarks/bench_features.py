@@ -0,0 +1,41 @@
+"""
+Per-row cost of the scalar and columnar paths of src/features.py.
+
+Run from the repository root: python -m benchmarks.bench_features
+"""
+import time
+
+import pandas as pd
+
+from src.features import INPUTS, derive_columns, derive_row, parse_columns, parse_row
+
+RAW_PATH = "data/raw/cardio_train.csv"
+N_ROWS = 20_000
+
+
+def load_requests():
+    raw = pd.read_csv(RAW_PATH, sep=";", nrows=N_ROWS)
+    raw["age"] = (raw["age"] / 365).astype(int)
+    return raw[list(INPUTS)]
+
+
+def main():
+    df = load_requests()
+    records = df.to_dict("records")
+
+    start = time.perf_counter()
+    for record in records:
+        derive_row(parse_row(record))
+    scalar = (time.perf_counter() - start) / len(records)
+
+    start = time.perf_counter()
+    derive_columns(parse_columns(df))
+    columnar = (time.perf_counter() - start) / len(df)
+
+    print(f"Rows: {len(df)}")
+    print(f"Scalar path   (parse_row + derive_row):         {scalar * 1e6:8.2f} us/row")
+    print(f"Columnar path (parse_columns + derive_columns): {columnar * 1e6:8.2f} us/row")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Latency and throughput of single-row scoring under concurrent request
+threads: one explain_batch call per request (the current mode) against the
+MicroBatcher gathering concurrent requests into one call.
+
+Run from the repository root: python -m benchmarks.bench_micro_batching
+"""
+import threading
+import time
+
+import numpy as np
+
+from src.batching import MicroBatcher
+from src.dataset import load_dataset
+from src.features import FEATURES, TARGET
+from src.model import build_forest, build_tree, compile_model
+
+DATA_PATH = "data/processed/CardioPreprocessed.csv"
+N_THREADS = 16
+REQUESTS_PER_THREAD = 300
+SETTINGS = [(16, 200), (32, 500), (64, 1000)]  # (max batch size, max wait in us)
+
+
+def score_rows(model, X):
+    predictions, _, contributions = model.explain_batch(X)
+    return list(zip(predictions, contributions))
+
+
+def run(predict, X):
+    """
+    Fire REQUESTS_PER_THREAD single-row calls from each of N_THREADS threads.
+    Returns (per-call latencies in seconds, requests per second).
+    """
+    latencies = [[] for _ in range(N_THREADS)]
+    start_barrier = threading.Barrier(N_THREADS + 1)
+
+    def client(thread):
+        rows = X[thread::N_THREADS][:REQUESTS_PER_THREAD]
+        start_barrier.wait()
+        for row in rows:
+            start = time.perf_counter()
+            predict(row)
+            latencies[thread].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=client, args=(thread,)) for thread in range(N_THREADS)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies = np.concatenate(latencies)
+    return latencies, len(latencies) / elapsed
+
+
+def report(label, latencies, throughput):
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1e3
+    print(f"  {label:<28} p50 {p50:7.3f} ms   p99 {p99:7.3f} ms   {throughput:9.0f} req/s")
+
+
+def main():
+    X, y, _ = load_dataset(DATA_PATH, TARGET)
+    X = np.asarray(X)
+    train = np.column_stack((X, y))
+    models = {
+        "tree (depth 10)": build_tree(train, 10, 20, max_bins=255),
+        "forest (50 x depth 10)": build_forest(train, 50, 10, 20, max_bins=255, random_state=0),
+    }
+
+    print(f"{N_THREADS} threads x {REQUESTS_PER_THREAD} single-row requests")
+    for name, trained in models.items():
+        model = compile_model(trained, len(FEATURES))
+        print(name)
+        report("per request (current)", *run(lambda row: score_rows(model, row)[0], X))
+        for max_batch_size, max_wait_us in SETTINGS:
+            batcher = MicroBatcher(score_rows, max_batch_size=max_batch_size, max_wait_us=max_wait_us)
+            latencies, throughput = run(lambda row: batcher.predict(model, row), X)
+            stats = batcher.stats()
+            report(f"batched {max_batch_size:>3} rows/{max_wait_us:>5} us", latencies, throughput)
+            print(f"  {'':<28} mean batch {stats['meanBatchSize']:.1f} rows")
+
+
+if __name__ == "__main__":
+    main()
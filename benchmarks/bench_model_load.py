@@ -0,0 +1,92 @@
+"""
+Startup cost of loading a model from the pickled dict tree (unpickle +
+compile_model) versus memory-mapping the compact binary model file.
+Each load runs in a fresh interpreter; RSS is read from /proc (Linux).
+
+Run from the repository root: python -m benchmarks.bench_model_load
+"""
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from src.dataset import load_dataset
+from src.features import FEATURES, TARGET
+from src.model import build_forest, compile_model
+from src.model_file import save_model_file
+
+DATA_PATH = "data/processed/CardioPreprocessed.csv"
+N_TREES = 50
+MAX_DEPTH = 12
+MIN_SIZE = 20
+N_RUNS = 5
+
+LOADERS = {
+    "pickle": (
+        "import pickle\n"
+        "from src.model import compile_model\n"
+        "def load(path):\n"
+        "    with open(path, 'rb') as f:\n"
+        "        return compile_model(pickle.load(f))\n"
+    ),
+    "mmap": (
+        "from src.model_file import load_model_file\n"
+        "def load(path):\n"
+        "    return load_model_file(path)[0]\n"
+    ),
+}
+
+MEASURE = (
+    "import time\n"
+    "import numpy as np\n"
+    "def rss_kb():\n"
+    "    with open('/proc/self/status') as f:\n"
+    "        return next(int(line.split()[1]) for line in f if line.startswith('VmRSS'))\n"
+    "{loader}"
+    "before = rss_kb()\n"
+    "start = time.perf_counter()\n"
+    "model = load({path!r})\n"
+    "model.predict_batch(np.zeros({n_features}))\n"
+    "print(time.perf_counter() - start, rss_kb() - before)\n"
+)
+
+
+def measure(kind, path):
+    script = MEASURE.format(loader=LOADERS[kind], path=path, n_features=len(FEATURES))
+    seconds, rss = [], []
+    for _ in range(N_RUNS):
+        output = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True
+        ).stdout.split()
+        seconds.append(float(output[0]))
+        rss.append(int(output[1]))
+    return np.median(seconds), np.median(rss)
+
+
+def main():
+    X, y, _ = load_dataset(DATA_PATH, TARGET)
+    train = np.column_stack((X, y))
+    print(f"Training a {N_TREES}-tree forest (max_depth={MAX_DEPTH}) to load...")
+    forest = build_forest(train, N_TREES, MAX_DEPTH, MIN_SIZE, max_bins=255, random_state=0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {
+            "pickle": os.path.join(directory, "model.pkl"),
+            "mmap": os.path.join(directory, "model.bin"),
+        }
+        with open(paths["pickle"], "wb") as f:
+            pickle.dump(forest, f)
+        save_model_file(paths["mmap"], compile_model(forest), {"features": FEATURES})
+
+        print(f"{'Format':<8} {'File size':>12} {'Load + first predict':>22} {'RSS growth':>12}")
+        for kind, path in paths.items():
+            seconds, rss = measure(kind, path)
+            size = os.path.getsize(path)
+            print(f"{kind:<8} {size / 1024:9.0f} KiB {seconds * 1e3:19.2f} ms {rss / 1024:8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    """
+    Gathers single-row predictions submitted by concurrent request threads
+    into small batches scored in one vectorized call. A batch is scored when
+    it holds `max_batch_size` rows or `max_wait_us` microseconds after its
+    first row arrived, whichever comes first.
+
+    `score_batch(model, X)` must return one result per row of X; rows
+    submitted for different models (around a hot reload) are scored apart.
+    """
+
+    def __init__(self, score_batch, max_batch_size=16, max_wait_us=200):
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_us / 1e6
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.max_seen_batch = 0
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Started on first use in each process: threads do not survive a fork
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                    threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+                    self._pid = os.getpid()
+
+    def submit(self, model, features):
+        """
+        Queue one feature vector; the returned Future resolves to its result.
+        """
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((model, features, future))
+        return future
+
+    def predict(self, model, features):
+        return self.submit(model, features).result()
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[0]), []).append(item)
+
+            for items in groups.values():
+                try:
+                    results = self.score_batch(items[0][0], np.array([features for _, features, _ in items]))
+                except Exception as e:
+                    for _, _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, _, future), result in zip(items, results):
+                    future.set_result(result)
+
+            with self._lock:
+                self.requests += len(batch)
+                self.batches += 1
+                self.max_seen_batch = max(self.max_seen_batch, len(batch))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "maxBatchSize": self.max_batch_size,
+                "maxWaitMicroseconds": self.max_wait * 1e6,
+                "queueDepth": self._queue.qsize(),
+                "requests": self.requests,
+                "batches": self.batches,
+                "meanBatchSize": self.requests / self.batches if self.batches else 0.0,
+                "largestBatch": self.max_seen_batch,
+            }
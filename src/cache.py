@@ -0,0 +1,291 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def feature_key(features):
+    """
+    Canonical cache key of a feature vector: 60 and 60.0 map to the same key.
+    """
+    return tuple(float(value) for value in features)
+
+
+class SharedPredictionStore:
+    """
+    Prediction store shared by all worker processes on one host, kept in a
+    small SQLite file. Values are stored as JSON, tagged with the model
+    version, and expire after their TTL; the file is a disposable cache, so
+    writes skip fsync.
+    """
+
+    def __init__(self, path, max_size=100_000):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+        self._writes = 0
+
+    def _ensure_connection(self):
+        # Opened on first use in each process: a connection must not be shared across a fork
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=OFF")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_cache ("
+                " version TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+                " expires REAL NOT NULL, PRIMARY KEY (version, key))"
+            )
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, version, key):
+        with self._lock:
+            row = self._ensure_connection().execute(
+                "SELECT value FROM prediction_cache WHERE version = ? AND key = ? AND expires > ?",
+                (version, repr(key), time.time())
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, version, key, value, ttl):
+        with self._lock:
+            self._ensure_connection().execute(
+                "INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?, ?)",
+                (version, repr(key), json.dumps(value), time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % 1000 == 0:
+                self._prune(version)
+
+    def _prune(self, version):
+        # Drop other model versions and expired rows, then the soonest to expire
+        self._connection.execute(
+            "DELETE FROM prediction_cache WHERE version != ? OR expires <= ?",
+            (version, time.time())
+        )
+        self._connection.execute(
+            "DELETE FROM prediction_cache WHERE rowid IN ("
+            " SELECT rowid FROM prediction_cache ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        )
+
+
+class PredictionCache:
+    """
+    In-process LRU cache of model outputs keyed on the canonical feature
+    tuple, bounded to `max_size` entries that live for `ttl` seconds.
+    Entries belong to one model version; asking with a different version
+    drops them all. An optional SharedPredictionStore is consulted on local
+    misses so workers can reuse each other's results.
+    """
+
+    def __init__(self, max_size=4096, ttl=3600, shared=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get_or_compute(self, version, features, compute):
+        """
+        Return the cached output for `features` under model `version`, or
+        call `compute()` and cache its result.
+        """
+        key = feature_key(features)
+        now = time.monotonic()
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+                self.expirations += 1
+
+        value = self.shared.get(version, key) if self.shared is not None else None
+        if value is not None:
+            with self._lock:
+                self.shared_hits += 1
+        else:
+            value = compute()
+            with self._lock:
+                self.misses += 1
+            if self.shared is not None:
+                self.shared.put(version, key, value, self.ttl)
+
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = (value, now + self.ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "version": self.version,
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "ttlSeconds": self.ttl,
+                "hits": self.hits,
+                "sharedHits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hitRate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            }
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of verified auth tokens mapped to a lightweight user
+    record. An entry lives for `ttl` seconds but never past the token's own
+    `exp`, and every token of a user can be dropped at once when that user
+    changes. Invalidation is per process; changes made by other workers are
+    picked up through `poll(cursor)`, called at most every `poll_interval`
+    seconds, which returns the ids of users changed since `cursor` (None on
+    the first call) and the next cursor.
+    """
+
+    def __init__(self, max_size=10_000, ttl=300, poll=None, poll_interval=2.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        self._lock = threading.Lock()
+        self._cursor = None
+        self._next_poll = 0.0
+        # Bumped by every invalidation, so a record verified before one is not cached after it
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.polls = 0
+
+    def sync(self):
+        """
+        Drop the tokens of users changed elsewhere, if `poll_interval`
+        seconds have passed since the last poll.
+        """
+        if self.poll is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.poll_interval
+            cursor = self._cursor
+        user_ids, cursor = self.poll(cursor)
+        with self._lock:
+            self.polls += 1
+            self._cursor = cursor
+        for user_id in user_ids:
+            self.invalidate_user(user_id)
+
+    def get(self, token):
+        self.sync()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            record, expires = entry
+            if expires <= time.time():
+                self._remove(token)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return record
+
+    def put(self, token, record, exp=None, generation=None):
+        """
+        Cache `record` (which must have an `id`) for a verified `token`
+        whose expiry, if any, is the Unix time `exp`. With `generation`
+        (read before verifying), nothing is cached if a user was
+        invalidated in the meantime.
+        """
+        expires = time.time() + self.ttl
+        if exp is not None:
+            expires = min(expires, exp)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (record, expires)
+            self._tokens_by_user.setdefault(record.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            tokens = self._tokens_by_user.pop(user_id, ())
+            for token in tokens:
+                del self._entries[token]
+            self.invalidations += len(tokens)
+            self.generation += 1
+
+    def _remove(self, token):
+        record, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(record.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[record.id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxSize": self.max_size,
+                "ttlSeconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "polls": self.polls,
+                # Every hit skips a jwt.decode and a User query; every poll is a query
+                "dbRoundTripsSaved": self.hits - self.polls,
+            }
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .features import FEATURES
+
+# Bump when the cache layout changes so old caches are rebuilt
+CACHE_FORMAT = 1
+
+
+def clean_columns(df):
+    """
+    Normalise column names and drop unnamed index columns.
+    """
+    df.columns = df.columns.str.lower().str.strip()
+    return df.loc[:, ~df.columns.str.contains("^unnamed")]
+
+
+def split_features(df, target):
+    """
+    Split a cleaned frame into the model feature columns, in the order the
+    shared feature pipeline declares, and the target column.
+    """
+    return df[FEATURES], df[target]
+
+
+def cache_dir(csv_path):
+    return os.path.splitext(csv_path)[0] + ".cache"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_cache(csv_path, target):
+    """
+    Parse a processed CSV once and write a binary cache next to it:
+    X.npy (float64 feature matrix), y.npy (target in its own dtype) and
+    schema.json (column names and dtypes plus the source CSV's size, mtime
+    and SHA-256). Both arrays can be memory-mapped with np.load.
+    """
+    df = clean_columns(pd.read_csv(csv_path))
+    features, labels = split_features(df, target)
+
+    directory = cache_dir(csv_path)
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, "X.npy"), features.values.astype(np.float64))
+    np.save(os.path.join(directory, "y.npy"), labels.values)
+
+    stat = os.stat(csv_path)
+    schema = {
+        "format": CACHE_FORMAT,
+        "features": features.columns.tolist(),
+        "dtypes": {column: str(dtype) for column, dtype in df.dtypes.items()},
+        "target": target,
+        "n_rows": len(df),
+        "source": {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_sha256(csv_path),
+        },
+    }
+    # schema.json is written last, so a half-written cache is never valid
+    write_schema(directory, schema)
+    return schema
+
+
+def write_schema(directory, schema):
+    tmp_path = os.path.join(directory, "schema.json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(schema, f, indent=2)
+    os.replace(tmp_path, os.path.join(directory, "schema.json"))
+
+
+def cached_schema(csv_path, target):
+    """
+    Return the cache schema if the cache still matches `csv_path` and the
+    current FEATURES, else None. Size and mtime are checked first; the
+    content hash only when they moved.
+    """
+    directory = cache_dir(csv_path)
+    try:
+        with open(os.path.join(directory, "schema.json")) as f:
+            schema = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if schema.get("format") != CACHE_FORMAT or schema.get("target") != target:
+        return None
+    # X.npy holds the columns of the feature list it was built with
+    if schema.get("features") != FEATURES:
+        return None
+
+    stat = os.stat(csv_path)
+    source = schema["source"]
+    if stat.st_size == source["size"] and stat.st_mtime_ns == source["mtime_ns"]:
+        return schema
+    if stat.st_size != source["size"] or file_sha256(csv_path) != source["sha256"]:
+        return None
+
+    # Same content, touched file: remember the new mtime to skip hashing next time
+    source["mtime_ns"] = stat.st_mtime_ns
+    write_schema(directory, schema)
+    return schema
+
+
+def load_dataset(csv_path, target):
+    """
+    Memory-map the features and target of a processed CSV from its binary
+    cache, rebuilding the cache first if the CSV changed since it was written.
+    Returns (X, y, feature_names).
+    """
+    schema = cached_schema(csv_path, target)
+    if schema is None:
+        print("Dataset cache missing or stale, rebuilding from CSV...")
+        schema = build_cache(csv_path, target)
+
+    directory = cache_dir(csv_path)
+    X = np.load(os.path.join(directory, "X.npy"), mmap_mode="r")
+    y = np.load(os.path.join(directory, "y.npy"), mmap_mode="r")
+    return X, y, schema["features"]
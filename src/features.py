@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+
+# ---------------- SCHEMA ----------------
+# Raw patient inputs, as sent to /api/predict, with the default used when a
+# value is missing or not a number. Age is in years.
+INPUTS = {
+    "age": (int, 0),
+    "gender": (int, 1),
+    "height": (int, 160),
+    "weight": (float, 70.0),
+    "ap_hi": (int, 120),
+    "ap_lo": (int, 80),
+    "cholesterol": (int, 1),
+    "gluc": (int, 1),
+    "smoke": (int, 0),
+    "alco": (int, 0),
+    "active": (int, 1),
+}
+
+# Model feature columns, in the order of CardioPreprocessed.csv
+FEATURES = [
+    "age_years",
+    "gender",
+    "weight",
+    "ap_hi",
+    "ap_lo",
+    "cholesterol",
+    "gluc",
+    "smoke",
+    "alco",
+    "active",
+    "bmi",
+    "pulse_pressure",
+    "health_index",
+]
+TARGET = "cardio"
+# ----------------------------------------
+
+
+def bmi(weight, height):
+    """
+    Body mass index from weight in kg and height in cm (0 for a height <= 0).
+    """
+    height_m = height / 100
+    if np.ndim(height_m):
+        safe_height = np.where(height_m > 0, height_m, 1.0)
+        return np.where(height_m > 0, weight / safe_height ** 2, 0.0)
+    return weight / height_m ** 2 if height_m > 0 else 0.0
+
+
+def health_index(cholesterol, gluc, smoke, alco, active):
+    """
+    Count of risk markers: raised cholesterol or glucose, smoking, alcohol
+    and physical inactivity.
+    """
+    return (cholesterol > 1) * 1 + (gluc > 1) * 1 + smoke + alco + (active == 0) * 1
+
+
+# How each feature is computed from the inputs. Every expression works on
+# Python scalars and on NumPy columns alike, so both paths share it.
+DERIVATIONS = {
+    "age_years": lambda x: x["age"],
+    "gender": lambda x: x["gender"],
+    "weight": lambda x: x["weight"],
+    "ap_hi": lambda x: x["ap_hi"],
+    "ap_lo": lambda x: x["ap_lo"],
+    "cholesterol": lambda x: x["cholesterol"],
+    "gluc": lambda x: x["gluc"],
+    "smoke": lambda x: x["smoke"],
+    "alco": lambda x: x["alco"],
+    "active": lambda x: x["active"],
+    "bmi": lambda x: bmi(x["weight"], x["height"]),
+    "pulse_pressure": lambda x: x["ap_hi"] - x["ap_lo"],
+    "health_index": lambda x: health_index(x["cholesterol"], x["gluc"], x["smoke"], x["alco"], x["active"]),
+}
+_DERIVE_IN_ORDER = [DERIVATIONS[name] for name in FEATURES]
+
+
+def parse_row(data):
+    """
+    Scalar path: read one patient's inputs from a dict of request values.
+    Missing, empty or non-numeric values fall back to the input's default.
+    """
+    inputs = {}
+    for name, (kind, default) in INPUTS.items():
+        value = data.get(name)
+        try:
+            inputs[name] = default if value is None or value == '' else kind(value)
+        except (TypeError, ValueError):
+            inputs[name] = default
+    return inputs
+
+
+def derive_row(inputs):
+    """
+    Scalar path: the model feature vector (a list in FEATURES order) of one
+    patient, computed with plain Python arithmetic.
+    """
+    return [derive(inputs) for derive in _DERIVE_IN_ORDER]
+
+
+def parse_columns(df):
+    """
+    Columnar path: read the inputs of many patients from a DataFrame as
+    NumPy columns, with the same defaults as parse_row. Integer inputs are
+    truncated towards zero.
+    """
+    inputs = {}
+    for name, (kind, default) in INPUTS.items():
+        column = df[name] if name in df else pd.Series(np.nan, index=df.index)
+        values = pd.to_numeric(column, errors="coerce").fillna(default).to_numpy(dtype=np.float64)
+        inputs[name] = values if kind is float else np.trunc(values).astype(np.int64)
+    return inputs
+
+
+def derive_columns(inputs):
+    """
+    Columnar path: the (n_rows, len(FEATURES)) float64 feature matrix of many
+    patients, computed with whole-column NumPy operations.
+    """
+    n_rows = len(inputs["age"])
+    matrix = np.empty((n_rows, len(FEATURES)), dtype=np.float64)
+    for position, derive in enumerate(_DERIVE_IN_ORDER):
+        matrix[:, position] = derive(inputs)
+    return matrix
+
+
+def features_from_raw(raw):
+    """
+    Build the processed training frame (FEATURES plus TARGET) from the raw
+    cardio_train.csv frame, where age is given in days.
+    """
+    raw = raw.drop(columns="id", errors="ignore").drop_duplicates()
+    inputs = {name: raw[name].to_numpy() for name in INPUTS if name != "age"}
+    inputs["age"] = (raw["age"].to_numpy() / 365).astype(int)
+
+    processed = pd.DataFrame({name: DERIVATIONS[name](inputs) for name in FEATURES})
+    processed[TARGET] = raw[TARGET].to_numpy()
+    return processed
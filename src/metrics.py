@@ -0,0 +1,183 @@
+import bisect
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from 50 microseconds (a cached prediction) to
+# 10 seconds (a model reload)
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """
+    Monotonic count per combination of label values.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    """
+    Distribution of observed values (seconds, for latencies) over fixed
+    buckets per combination of label values. observe() is a bisect and a few
+    additions under a lock, cheap enough for every request.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [count per bucket (+Inf last), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        bucket = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bucket] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        """
+        Observe the wall time of the `with` block, also when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def samples(self):
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labels, label_values, [("le", le)])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {total!r}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class StageTimer:
+    """
+    Times consecutive stages of one request: each mark(stage) observes the
+    time since the previous mark (or since creation) in `histogram` under
+    that stage's label, and keeps it in `seconds` for logging.
+    """
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.seconds = {}
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        self.seconds[stage] = elapsed
+        self.histogram.observe(elapsed, stage)
+
+
+class MetricsRegistry:
+    """
+    The metrics of one process, rendered in the Prometheus text format.
+    Each worker process keeps its own, like the other in-process caches.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Modules re-imported (e.g. in a reloader) get the same metric back
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Shared by the API and the src modules it instruments
+REGISTRY = MetricsRegistry()
+
+
+class SampledLog:
+    """
+    Structured (one JSON object per line) event logging for hot paths:
+    `sample` logs a fraction `rate` of events, `always` logs every one
+    (errors, security events). Events go to a standard logging.Logger.
+    """
+
+    def __init__(self, logger, rate=0.01):
+        self.logger = logger
+        self.rate = rate
+
+    def sample(self, event, **fields):
+        if self.rate > 0 and random.random() < self.rate:
+            self._emit(self.logger.info, event, fields)
+
+    def always(self, event, **fields):
+        self._emit(self.logger.warning, event, fields)
+
+    def _emit(self, log, event, fields):
+        log(json.dumps({"event": event, "time": time.time(), **fields}, default=str))
@@ -1,8 +1,21 @@
+import logging
+import os
+import tempfile
+import types
+
 import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .metrics import SampledLog
+from .shared import attach_array, release, share_array
+
+# Structured events of the serving-side model code, under the API's 'cardio' loggers
+model_log = SampledLog(logging.getLogger("cardio.model"))
 
 def gini_index(groups, classes):
     """
     Calculate the Gini index for a split dataset.
+    Each group is the array of target values that fall on one side of the split.
     Optimized with vectorization.
     """
     # Count total samples
@@ -15,11 +28,8 @@ def gini_index(groups, classes):
             continue
             
         # Vectorized purity score
-        # Vectorized purity score
-        # Use the last column as the target, consistent with train_data construction
-        outcomes = group[:, -1]
+        outcomes = group
 
-        
         # Optimized for integer classes (common in ML)
         if np.issubdtype(outcomes.dtype, np.integer):
             # Pad with zeros if some classes are missing in this group
@@ -33,98 +43,488 @@ def gini_index(groups, classes):
         
     return gini
 
-def test_split(index, value, dataset):
+def partition_rows(rows, mask):
     """
-    Split a dataset based on an attribute and an attribute value.
+    Reorder `rows` in place so rows where `mask` is True come first.
+    Returns the two halves as views of `rows`, so children never copy the data.
     """
-    left = dataset[dataset[:, index] < value]
-    right = dataset[dataset[:, index] >= value]
-    return left, right
+    n_left = int(np.count_nonzero(mask))
+    rows[:] = np.concatenate((rows[mask], rows[~mask]))
+    return rows[:n_left], rows[n_left:]
 
-def get_best_split(dataset):
+def get_best_split(dataset, rows=None, features=None):
     """
-    Select the best split point for a dataset.
+    Select the best split point for the given rows of a dataset.
     Uses Quantiles/Percentiles to optimize speed for continuous variables.
+    Only the node's rows of one column are gathered at a time; `rows` is
+    partitioned in place and the returned groups are views of it.
+    `features` optionally restricts the search to a subset of columns.
     """
-    class_values = np.unique(dataset[:, -1])
-    best_index, best_value, best_groups = None, None, None
+    if rows is None:
+        rows = np.arange(len(dataset))
+    targets = dataset[rows, -1]
+    class_values = np.unique(targets)
+    best_index, best_value = None, None
     best_score = 1.0  # Gini ranges 0 to 0.5 (binary) or 1.0, minimize it
     
-    n_features = dataset.shape[1] - 1
+    if features is None:
+        features = range(dataset.shape[1] - 1)
     
-    for index in range(n_features):
+    for index in features:
+        column = dataset[rows, index]
+
         # OPTIMIZATION: Instead of checking every unique value, check percentiles
         # This speeds up training 100x on large data
-        unique_values = np.unique(dataset[:, index])
+        unique_values = np.unique(column)
         
         if len(unique_values) > 10:
-            # Check 10 split points (deciles)
             # Check 50 split points (every 2%) to improve accuracy
             # Checking only 10 points (deciles) was too coarse and lost accuracy
-            splits = np.percentile(dataset[:, index], np.linspace(2, 98, 49))
+            splits = np.percentile(column, np.linspace(2, 98, 49))
         else:
             splits = unique_values
             
         for value in splits:
-            groups = test_split(index, value, dataset)
-            gini = gini_index(groups, class_values)
+            mask = column < value
+            gini = gini_index((targets[mask], targets[~mask]), class_values)
             
             if gini < best_score:
                 best_index = index
                 best_value = value
                 best_score = gini
-                best_groups = groups
                 
-    return {'index': best_index, 'value': best_value, 'groups': best_groups}
+    mask = dataset[rows, best_index] < best_value
+    return {'index': best_index, 'value': best_value, 'groups': partition_rows(rows, mask)}
+
+def bin_dataset(train, max_bins=255, rows=None):
+    """
+    Quantise every feature once into small integer bins for histogram split search.
+    Features with at most `max_bins` unique values keep every unique value as a
+    candidate threshold; wider features use `max_bins` quantiles of the full data,
+    a finer grid than the 49 per-node percentiles used by get_best_split.
+    codes[i, f] counts the thresholds of feature f that are <= row i, so
+    `X[:, f] < thresholds[f][b]` is equivalent to `codes[:, f] <= b`.
+    Thresholds are taken from `rows` only (all rows by default); codes cover
+    every row of `train`.
+    """
+    if not 1 <= max_bins <= 255:
+        raise ValueError("max_bins must be between 1 and 255")
+
+    targets = train[:, -1]
+    classes, target_index = np.unique(targets, return_inverse=True)
+
+    codes = np.empty((len(train), train.shape[1] - 1), dtype=np.uint8)
+    thresholds = []
+    for index in range(codes.shape[1]):
+        column = train[:, index] if rows is None else train[rows, index]
+        unique_values = np.unique(column)
+        if len(unique_values) > max_bins:
+            edges = np.unique(np.percentile(column, np.linspace(0, 100, max_bins + 2)[1:-1]))
+        else:
+            edges = unique_values
+        codes[:, index] = np.searchsorted(edges, train[:, index], side='right')
+        thresholds.append(edges)
+
+    return {
+        'codes': codes,
+        'targets': targets,
+        'target_index': target_index,
+        'n_classes': len(classes),
+        'thresholds': thresholds,
+    }
+
+def weighted_gini(left_counts, right_counts):
+    """
+    Weighted Gini index of many candidate splits at once.
+    Each row of `left_counts`/`right_counts` holds per-class counts of one split.
+    """
+    n_left = left_counts.sum(axis=1)
+    n_right = right_counts.sum(axis=1)
+    n_instances = n_left + n_right
+
+    # size * (1 - sum(p^2)) == size - sum(count^2) / size; empty groups contribute 0
+    left_impurity = n_left - np.divide((left_counts ** 2).sum(axis=1), n_left,
+                                       out=np.zeros(len(n_left)), where=n_left > 0)
+    right_impurity = n_right - np.divide((right_counts ** 2).sum(axis=1), n_right,
+                                         out=np.zeros(len(n_right)), where=n_right > 0)
+    return (left_impurity + right_impurity) / n_instances
+
+def get_best_split_hist(binned, rows, features=None):
+    """
+    Select the best split point for the rows of a binned dataset.
+    Builds one per-class histogram per feature and scores every threshold of that
+    feature in a single pass over the cumulative counts.
+    `features` optionally restricts the search to a subset of columns.
+    """
+    codes = binned['codes'][rows]
+    target_index = binned['target_index'][rows]
+    n_classes = binned['n_classes']
+    best_index, best_value, best_bin = None, None, None
+    best_score = 1.0
 
-def to_terminal(group):
+    if features is None:
+        features = range(len(binned['thresholds']))
+
+    for index in features:
+        edges = binned['thresholds'][index]
+        n_bins = len(edges) + 1
+        hist = np.bincount(
+            codes[:, index].astype(np.intp) * n_classes + target_index,
+            minlength=n_bins * n_classes
+        ).reshape(n_bins, n_classes)
+
+        # Row b holds the class counts of `X < edges[b]`
+        left_counts = np.cumsum(hist, axis=0)[:-1]
+        right_counts = left_counts[-1] + hist[-1] - left_counts
+        gini = weighted_gini(left_counts, right_counts)
+
+        candidate = int(np.argmin(gini))
+        if gini[candidate] < best_score:
+            best_index = index
+            best_value = edges[candidate]
+            best_bin = candidate
+            best_score = gini[candidate]
+
+    mask = codes[:, best_index] <= best_bin
+    return {'index': best_index, 'value': best_value, 'groups': partition_rows(rows, mask)}
+
+def node_impurity(targets):
+    """
+    Gini impurity of the target values of one node.
+    """
+    if len(targets) == 0:
+        return 0.0
+    _, counts = np.unique(targets, return_counts=True)
+    proportions = counts / len(targets)
+    return 1.0 - np.sum(proportions ** 2)
+
+def impurity_decrease(targets, left, right):
+    """
+    Weighted Gini decrease of splitting rows `left` + `right` into the two,
+    counted in samples: n * gini(node) - n_left * gini(left) - n_right * gini(right).
+    """
+    rows = np.concatenate((left, right))
+    return (
+        len(rows) * node_impurity(targets[rows])
+        - len(left) * node_impurity(targets[left])
+        - len(right) * node_impurity(targets[right])
+    )
+
+def to_terminal(targets):
     """
-    Create a terminal node value.
-    Returns the most common output value in a list of rows.
+    Create a terminal node value from the target values of a group.
     """
-    outcomes = group[:, -1]
     # returns probability of class 1, not hard label
-    return np.mean(outcomes)
+    return np.mean(targets)
 
-def split(node, max_depth, min_size, depth):
+def split(node, find_split, targets, max_depth, min_size, depth, handoff=None):
     """
     Recursive function to create child nodes or terminal nodes.
+    Groups are row indices into `targets`; `find_split` turns the rows of a
+    child into its split node. `handoff(rows, depth)` may return a placeholder
+    for a child subtree grown elsewhere, or None to grow it here.
     """
     left, right = node['groups']
     del(node['groups'])
+
+    def grow(rows):
+        child = handoff(rows, depth+1) if handoff else None
+        if child is None:
+            child = find_split(rows)
+            split(child, find_split, targets, max_depth, min_size, depth+1, handoff)
+        return child
     
     # check for a no split
     if len(left) == 0 or len(right) == 0:
-        node['left'] = node['right'] = to_terminal(np.vstack((left, right)))
+        node['left'] = node['right'] = to_terminal(targets[np.concatenate((left, right))])
         return
     
     # check for max depth
     if depth >= max_depth:
-        node['left'], node['right'] = to_terminal(left), to_terminal(right)
+        node['left'], node['right'] = to_terminal(targets[left]), to_terminal(targets[right])
         return
     
     # process left child
     if len(left) <= min_size:
-        node['left'] = to_terminal(left)
+        node['left'] = to_terminal(targets[left])
     else:
-        node['left'] = get_best_split(left)
-        split(node['left'], max_depth, min_size, depth+1)
+        node['left'] = grow(left)
         
     # process right child
     if len(right) <= min_size:
-        node['right'] = to_terminal(right)
+        node['right'] = to_terminal(targets[right])
+    else:
+        node['right'] = grow(right)
+
+def make_split_finder(train, binned=None, max_features=None, rng=None):
+    """
+    Return the split search for `train`: histogram based when `binned` is given.
+    With `max_features`, every node searches only that many features drawn
+    with `rng` (random forest style).
+    Split nodes also record their sample count and the value they would have
+    as a leaf, so smaller trees can be derived later with truncate_tree, and
+    the impurity decrease of their split, for feature_importance.
+    """
+    targets = train[:, -1]
+    n_features = train.shape[1] - 1
+    if binned is not None:
+        search = lambda rows, features: get_best_split_hist(binned, rows, features)
     else:
-        node['right'] = get_best_split(right)
-        split(node['right'], max_depth, min_size, depth+1)
+        search = lambda rows, features: get_best_split(train, rows, features)
+
+    def find_split(rows):
+        # Computed before the search partitions `rows`, exactly as a leaf would be
+        n_samples, leaf_value = len(rows), to_terminal(targets[rows])
+        features = None
+        if max_features and max_features < n_features:
+            features = np.sort(rng.choice(n_features, max_features, replace=False))
+        node = search(rows, features)
+        node['n_samples'] = n_samples
+        node['leaf_value'] = leaf_value
+        node['impurity_decrease'] = impurity_decrease(targets, *node['groups'])
+        return node
+
+    return find_split
+
+# Per-process state of tree-building workers, set once by _init_tree_worker
+_tree_worker = {}
+
+def share_training_data(train, binned, rows=None):
+    """
+    Put the training matrix, its bins and optionally the training rows in
+    shared memory. Returns the blocks to release and the picklable specs
+    _init_tree_worker expects.
+    """
+    blocks = []
+    shm, train_spec = share_array(train)
+    blocks.append(shm)
+    binned_specs = None
+    if binned is not None:
+        binned_specs = {'thresholds': binned['thresholds'], 'n_classes': binned['n_classes']}
+        for key in ('codes', 'target_index'):
+            shm, binned_specs[key] = share_array(binned[key])
+            blocks.append(shm)
+    rows_spec = None
+    if rows is not None:
+        shm, rows_spec = share_array(rows)
+        blocks.append(shm)
+    return blocks, (train_spec, binned_specs, rows_spec)
+
+def _init_tree_worker(train_spec, binned_specs, rows_spec, max_depth, min_size):
+    blocks = []
+    shm, train = attach_array(train_spec)
+    blocks.append(shm)
+    binned = None
+    if binned_specs is not None:
+        binned = dict(binned_specs)
+        for key in ('codes', 'target_index'):
+            shm, binned[key] = attach_array(binned_specs[key])
+            blocks.append(shm)
+    rows = None
+    if rows_spec is not None:
+        shm, rows = attach_array(rows_spec)
+        blocks.append(shm)
+
+    _tree_worker.update(
+        blocks=blocks,
+        train=train,
+        binned=binned,
+        rows=rows,
+        max_depth=max_depth,
+        min_size=min_size,
+    )
+
+def _grow_subtree(rows, depth):
+    state = _tree_worker
+    find_split = make_split_finder(state['train'], state['binned'])
+    node = find_split(rows)
+    split(node, find_split, state['train'][:, -1], state['max_depth'], state['min_size'], depth)
+    return node
+
+def _resolve_subtrees(node):
+    """
+    Replace subtree futures left by a parallel build with their results.
+    """
+    for side in ('left', 'right'):
+        if isinstance(node[side], Future):
+            node[side] = node[side].result()
+        elif isinstance(node[side], dict):
+            _resolve_subtrees(node[side])
+
+def build_tree_parallel(train, rows, max_depth, min_size, binned, n_jobs):
+    """
+    Grow the top of the tree here and hand every subtree of at most
+    len(rows) / (4 * n_jobs) rows to a pool of worker processes.
+    The training matrix and bins live in shared memory; workers receive only
+    row indices, in the same order as the serial build, so the tree is identical.
+    """
+    blocks, specs = share_training_data(train, binned)
+    try:
+        subtree_size = max(min_size, len(rows) // (4 * n_jobs))
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_tree_worker,
+            initargs=specs + (max_depth, min_size)
+        ) as pool:
+            def handoff(child_rows, depth):
+                if len(child_rows) > subtree_size:
+                    return None
+                return pool.submit(_grow_subtree, child_rows.copy(), depth)
+
+            find_split = make_split_finder(train, binned)
+            root = find_split(rows)
+            split(root, find_split, train[:, -1], max_depth, min_size, 1, handoff)
+            _resolve_subtrees(root)
+        return root
+    finally:
+        release(blocks)
 
-def build_tree(train, max_depth, min_size):
+def build_tree(train, max_depth, min_size, max_bins=None, rows=None, n_jobs=1):
     """
     Build a decision tree from training data.
+    With `max_bins` set, features are binned once up front and splits are
+    searched with per-class histograms instead of the percentile grid.
+    The tree is grown over `rows` of `train` (all rows by default) by
+    partitioning a single index array in place, so the training matrix is
+    never copied per node or per level.
+    With `n_jobs` > 1, subtrees are grown in parallel worker processes.
+    """
+    rows = np.arange(len(train)) if rows is None else np.array(rows)
+    binned = bin_dataset(train, max_bins, rows) if max_bins else None
+
+    if n_jobs > 1:
+        return build_tree_parallel(train, rows, max_depth, min_size, binned, n_jobs)
+
+    find_split = make_split_finder(train, binned)
+    root = find_split(rows)
+    split(root, find_split, train[:, -1], max_depth, min_size, 1)
+    return root
+
+def resolve_max_features(max_features, n_features):
+    """
+    Number of features searched per split: an int, 'sqrt', or None for all.
+    """
+    if max_features is None:
+        return n_features
+    if max_features == 'sqrt':
+        return max(1, int(np.sqrt(n_features)))
+    return min(int(max_features), n_features)
+
+def build_forest_tree(train, rows, max_depth, min_size, binned, max_features, seed):
     """
-    root = get_best_split(train)
-    split(root, max_depth, min_size, 1)
+    Grow one forest tree on a bootstrap sample of `rows`, searching
+    `max_features` random features per split. `seed` fixes both draws.
+    """
+    rng = np.random.default_rng(seed)
+    sample = rows[rng.integers(0, len(rows), len(rows))]
+    find_split = make_split_finder(train, binned, max_features, rng)
+    root = find_split(sample)
+    split(root, find_split, train[:, -1], max_depth, min_size, 1)
     return root
 
+def _grow_forest_tree(max_features, seed):
+    state = _tree_worker
+    rows = state['rows'] if state['rows'] is not None else np.arange(len(state['train']))
+    return build_forest_tree(
+        state['train'], rows, state['max_depth'], state['min_size'],
+        state['binned'], max_features, seed
+    )
+
+def build_forest(train, n_trees, max_depth, min_size, max_bins=None, rows=None,
+                 max_features='sqrt', n_jobs=1, random_state=None):
+    """
+    Build a bagged random forest: a list of `n_trees` dict trees, each grown on
+    a bootstrap sample of `rows` with `max_features` features tried per split.
+    Bins are computed once and shared by all trees. With `n_jobs` > 1 the
+    trees are grown in worker processes that map the training data from
+    shared memory; per-tree seeds make the result independent of n_jobs.
+    """
+    rows = np.arange(len(train)) if rows is None else np.array(rows)
+    binned = bin_dataset(train, max_bins, rows) if max_bins else None
+    max_features = resolve_max_features(max_features, train.shape[1] - 1)
+    seeds = np.random.SeedSequence(random_state).spawn(n_trees)
+
+    if n_jobs <= 1:
+        return [
+            build_forest_tree(train, rows, max_depth, min_size, binned, max_features, seed)
+            for seed in seeds
+        ]
+
+    blocks, specs = share_training_data(train, binned, rows)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_tree_worker,
+            initargs=specs + (max_depth, min_size)
+        ) as pool:
+            return list(pool.map(_grow_forest_tree, [max_features] * n_trees, seeds))
+    finally:
+        release(blocks)
+
+def truncate_tree(node, max_depth, min_size, depth=1):
+    """
+    Derive the tree build_tree would grow with (max_depth, min_size) from a
+    tree grown on the same data with a larger max_depth and a smaller or
+    equal min_size. Splitting is greedy and deterministic, so the smaller tree
+    is the larger one cut where either limit stops it.
+    """
+    pruned = {
+        'index': node['index'],
+        'value': node['value'],
+        'n_samples': node['n_samples'],
+        'leaf_value': node['leaf_value'],
+        'impurity_decrease': node.get('impurity_decrease', 0.0),
+    }
+    for side in ('left', 'right'):
+        child = node[side]
+        if not isinstance(child, dict):
+            pruned[side] = child
+        elif depth >= max_depth or child['n_samples'] <= min_size:
+            pruned[side] = child['leaf_value']
+        else:
+            pruned[side] = truncate_tree(child, max_depth, min_size, depth+1)
+    return pruned
+
+def feature_importance(model, n_features):
+    """
+    Impurity-decrease importance of each feature, normalised to sum to 1.
+    A forest averages the normalised importances of its trees.
+    """
+    if isinstance(model, list):
+        return np.mean([feature_importance(tree, n_features) for tree in model], axis=0)
+
+    importance = np.zeros(n_features)
+    stack = [model]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            importance[node['index']] += node.get('impurity_decrease', 0.0)
+            stack.extend((node['left'], node['right']))
+    total = importance.sum()
+    return importance / total if total > 0 else importance
+
+def fill_node_stats(tree, train):
+    """
+    Record n_samples, leaf_value and impurity_decrease on the split nodes of
+    a tree saved without them, by routing the rows of `train` (features +
+    target) down it.
+    """
+    targets = train[:, -1]
+
+    def fill(node, rows):
+        if not isinstance(node, dict):
+            return
+        go_left = train[rows, node['index']] < node['value']
+        left, right = rows[go_left], rows[~go_left]
+        node.setdefault('n_samples', len(rows))
+        node.setdefault('leaf_value', to_terminal(targets[rows]) if len(rows) else np.nan)
+        node.setdefault('impurity_decrease', impurity_decrease(targets, left, right))
+        fill(node['left'], left)
+        fill(node['right'], right)
+
+    fill(tree, np.arange(len(train)))
+    return tree
+
 def predict(node, row):
     """
     Make a prediction with a decision tree.
@@ -138,4 +538,400 @@ def predict(node, row):
         if isinstance(node['right'], dict):
             return predict(node['right'], row)
         else:
-            return node['right']
\ No newline at end of file
+            return node['right']
+
+def descend(feature, threshold, left, right, X, node, row):
+    """
+    Move every (node, row) walker down to its leaf, one level per step.
+    `node` holds the start node of each walker and is updated in place;
+    `row` is the row of X each walker evaluates.
+    """
+    active = np.arange(len(node))
+    while len(active):
+        features = feature[node[active]]
+        internal = features >= 0
+        active, features = active[internal], features[internal]
+        current = node[active]
+        go_left = X[row[active], features] < threshold[current]
+        node[active] = np.where(go_left, left[current], right[current])
+    return node
+
+def as_batch(X):
+    X = np.asarray(X, dtype=np.float64)
+    return X.reshape(1, -1) if X.ndim == 1 else X
+
+
+class CompiledTree:
+    """
+    Decision tree flattened into parallel NumPy arrays.
+    Node 0 is the root; node i is a leaf when feature[i] == -1, and its
+    prediction is value[i]. Internal nodes send rows with
+    X[feature] < threshold to left[i] and the rest to right[i].
+
+    For explanations, bias[0] is the root's probability and row i of the
+    (n_nodes, n_features) contribution table says how much the splits on
+    each feature along the path to node i moved the probability from it.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, bias=None, contribution=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.bias = bias
+        self.contribution = contribution
+        self.explainable = contribution is not None and not np.isnan(contribution).any()
+        # Generated single-row evaluator (see load_evaluator), if attached
+        self.evaluator = None
+
+    @property
+    def n_nodes(self):
+        return len(self.feature)
+
+    def predict_one(self, x):
+        """
+        Prediction of one feature vector, through the generated evaluator
+        when one is attached.
+        """
+        if self.evaluator is not None:
+            return self.evaluator.predict(x)
+        return float(self.predict_batch(x)[0])
+
+    def explain_one(self, x):
+        """
+        explain_batch for one feature vector: (prediction, bias, contributions).
+        """
+        if self.evaluator is None:
+            predictions, bias, contributions = self.explain_batch(x)
+            return predictions[0], bias[0], contributions[0]
+        node = self.evaluator.leaf(x)
+        return self.value[node], self.bias[0], self.contribution[node]
+
+    def predict_batch(self, X):
+        """
+        Predict all rows of X at once.
+        Rows move down the tree one level per step with vectorized ops.
+        """
+        X = as_batch(X)
+        node = descend(
+            self.feature, self.threshold, self.left, self.right,
+            X, np.zeros(len(X), dtype=np.intp), np.arange(len(X))
+        )
+        return self.value[node]
+
+    def explain_batch(self, X):
+        """
+        Predict all rows of X and attribute each prediction to the features
+        split on along its path. Returns (predictions, bias, contributions)
+        with contributions of shape (n_rows, n_features) and
+        predictions == bias + contributions.sum(axis=1) up to rounding.
+        Costs one table lookup per row on top of predict_batch.
+        """
+        X = as_batch(X)
+        node = descend(
+            self.feature, self.threshold, self.left, self.right,
+            X, np.zeros(len(X), dtype=np.intp), np.arange(len(X))
+        )
+        return self.value[node], np.full(len(X), self.bias[0]), self.contribution[node]
+
+
+class CompiledForest:
+    """
+    Random forest stacked into 2-D NumPy arrays of shape (n_trees, n_nodes).
+    Row t holds tree t in the CompiledTree layout, padded with leaf nodes;
+    child indices are local to their tree.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, bias=None, contribution=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.bias = bias
+        self.contribution = contribution
+        self.explainable = contribution is not None and not np.isnan(contribution).any()
+        self.evaluator = None
+
+    @property
+    def n_trees(self):
+        return self.feature.shape[0]
+
+    def predict_one(self, x):
+        if self.evaluator is not None:
+            return self.evaluator.predict(x)
+        return float(self.predict_batch(x)[0])
+
+    def explain_one(self, x):
+        if self.evaluator is None:
+            predictions, bias, contributions = self.explain_batch(x)
+            return predictions[0], bias[0], contributions[0]
+        trees = np.arange(self.n_trees)
+        nodes = list(self.evaluator.leaf(x))
+        return (
+            self.value[trees, nodes].mean(),
+            self.bias.mean(),
+            self.contribution[trees, nodes].sum(axis=0) / self.n_trees,
+        )
+
+    def predict_batch(self, X):
+        """
+        Mean prediction of all trees for all rows of X, in one vectorized pass
+        over every (tree, row) pair.
+        """
+        X = as_batch(X)
+        n_trees, n_nodes = self.feature.shape
+        offset = (np.arange(n_trees) * n_nodes)[:, None]
+
+        node = descend(
+            self.feature.ravel(), self.threshold.ravel(),
+            (self.left + offset).ravel(), (self.right + offset).ravel(),
+            X, np.repeat(offset.ravel(), len(X)), np.tile(np.arange(len(X)), n_trees)
+        )
+        return self.value.ravel()[node].reshape(n_trees, len(X)).mean(axis=0)
+
+    def explain_batch(self, X):
+        """
+        CompiledTree.explain_batch averaged over the trees.
+        """
+        X = as_batch(X)
+        n_trees, n_nodes = self.feature.shape
+        offset = (np.arange(n_trees) * n_nodes)[:, None]
+
+        node = descend(
+            self.feature.ravel(), self.threshold.ravel(),
+            (self.left + offset).ravel(), (self.right + offset).ravel(),
+            X, np.repeat(offset.ravel(), len(X)), np.tile(np.arange(len(X)), n_trees)
+        ).reshape(n_trees, len(X))
+        predictions = self.value.ravel()[node].mean(axis=0)
+
+        local = node - offset
+        if n_trees * len(X) <= 1 << 16:
+            contributions = self.contribution[np.arange(n_trees)[:, None], local].sum(axis=0)
+        else:
+            # One tree at a time, so memory stays at one (n_rows, n_features) table
+            contributions = np.zeros((len(X), self.contribution.shape[2]))
+            for tree in range(n_trees):
+                contributions += self.contribution[tree, local[tree]]
+        return predictions, np.full(len(X), self.bias.mean()), contributions / n_trees
+
+
+def compile_tree(tree, n_features=None):
+    """
+    Flatten a nested dict tree (as returned by build_tree) into a CompiledTree.
+    The explanation table is built from the leaf_value of split nodes, with
+    `n_features` columns (by default up to the highest feature split on);
+    trees saved before leaf_value was recorded get NaN (see fill_node_stats).
+    """
+    feature, threshold, left, right, value = [], [], [], [], []
+    paths = []
+    if n_features is None:
+        n_features = max_split_feature(tree) + 1
+
+    def add(node, path, parent_feature=-1, parent_value=np.nan):
+        position = len(feature)
+        node_value = node.get('leaf_value', np.nan) if isinstance(node, dict) else node
+        if parent_feature >= 0:
+            path = path.copy()
+            path[parent_feature] += node_value - parent_value
+        feature.append(-1)
+        threshold.append(np.nan)
+        left.append(-1)
+        right.append(-1)
+        value.append(np.nan)
+        paths.append(path)
+        if isinstance(node, dict):
+            feature[position] = node['index']
+            threshold[position] = node['value']
+            left[position] = add(node['left'], path, node['index'], node_value)
+            right[position] = add(node['right'], path, node['index'], node_value)
+        else:
+            value[position] = node
+        return position
+
+    add(tree, np.zeros(n_features))
+    root_value = tree.get('leaf_value', np.nan) if isinstance(tree, dict) else tree
+    return CompiledTree(
+        np.array(feature, dtype=np.int32),
+        np.array(threshold, dtype=np.float64),
+        np.array(left, dtype=np.int32),
+        np.array(right, dtype=np.int32),
+        np.array(value, dtype=np.float64),
+        np.array([root_value], dtype=np.float64),
+        np.array(paths, dtype=np.float64),
+    )
+
+
+def max_split_feature(tree):
+    if not isinstance(tree, dict):
+        return -1
+    return max(tree['index'], max_split_feature(tree['left']), max_split_feature(tree['right']))
+
+
+def compile_forest(trees, n_features=None):
+    """
+    Stack a list of dict trees (as returned by build_forest) into a CompiledForest.
+    """
+    if n_features is None:
+        n_features = max(max_split_feature(tree) for tree in trees) + 1
+    compiled = [compile_tree(tree, n_features) for tree in trees]
+    n_nodes = max(tree.n_nodes for tree in compiled)
+
+    def stack_tables(tables, n_nodes):
+        stacked = np.zeros((len(tables), n_nodes, n_features))
+        for position, table in enumerate(tables):
+            stacked[position, :len(table)] = table
+        return stacked
+
+    def stack(name, fill, dtype):
+        stacked = np.full((len(compiled), n_nodes), fill, dtype=dtype)
+        for position, tree in enumerate(compiled):
+            column = getattr(tree, name)
+            stacked[position, :len(column)] = column
+        return stacked
+
+    return CompiledForest(
+        stack('feature', -1, np.int32),
+        stack('threshold', np.nan, np.float64),
+        stack('left', -1, np.int32),
+        stack('right', -1, np.int32),
+        stack('value', np.nan, np.float64),
+        np.concatenate([tree.bias for tree in compiled]),
+        stack_tables([tree.contribution for tree in compiled], n_nodes),
+    )
+
+
+def compile_model(model, n_features=None):
+    """
+    Compile a trained model: a dict tree or a list of dict trees (a forest).
+    `n_features` sets the width of the explanation tables.
+    """
+    if isinstance(model, list):
+        return compile_forest(model, n_features)
+    return compile_tree(model, n_features)
+
+
+# --- GENERATED EVALUATORS ---
+# Python source with one nested `if x[i] < t:` per split node, so a single
+# prediction costs a few bytecode comparisons instead of NumPy calls per level
+MAX_GENERATED_DEPTH = 90  # CPython refuses more than 100 levels of indentation
+
+
+def _literal(value):
+    value = float(value)
+    return repr(value) if np.isfinite(value) else f"float('{value}')"
+
+
+def _tree_function(name, feature, threshold, left, right, leaf):
+    """
+    Source of `def name(x)` evaluating one tree in array layout; `leaf(node)`
+    is the expression a leaf returns. A right child follows its parent's
+    `if` block at the same indentation, so only left turns nest.
+    """
+    lines = [f"def {name}(x):"]
+    stack = [(0, 1)]
+    while stack:
+        node, depth = stack.pop()
+        if depth > MAX_GENERATED_DEPTH:
+            raise ValueError(f"tree is too deep to generate ({name})")
+        indent = "    " * depth
+        if feature[node] < 0:
+            lines.append(f"{indent}return {leaf(node)}")
+            continue
+        lines.append(f"{indent}if x[{feature[node]}] < {_literal(threshold[node])}:")
+        # Emitted in order: the left subtree inside the block, then the right one after it
+        stack.append((right[node], depth))
+        stack.append((left[node], depth + 1))
+    return "\n".join(lines)
+
+
+def generate_source(compiled, version=None):
+    """
+    Python module source evaluating a CompiledTree or CompiledForest on one
+    feature vector (any sequence indexable by feature position):
+    predict(x) returns the prediction, with leaf values as constants, and
+    leaf(x) the leaf node index (a tuple of one per tree for a forest).
+    """
+    if isinstance(compiled, CompiledForest):
+        trees = [
+            (compiled.feature[t], compiled.threshold[t], compiled.left[t], compiled.right[t], compiled.value[t])
+            for t in range(compiled.n_trees)
+        ]
+    else:
+        trees = [(compiled.feature, compiled.threshold, compiled.left, compiled.right, compiled.value)]
+
+    parts = [
+        '"""Generated by src.model.generate_source; do not edit."""',
+        f"VERSION = {version!r}",
+    ]
+    for t, (feature, threshold, left, right, value) in enumerate(trees):
+        parts.append(_tree_function(f"_predict_{t}", feature, threshold, left, right, lambda node: _literal(value[node])))
+        parts.append(_tree_function(f"_leaf_{t}", feature, threshold, left, right, str))
+
+    if isinstance(compiled, CompiledForest):
+        calls = " + ".join(f"_predict_{t}(x)" for t in range(len(trees)))
+        leaves = ", ".join(f"_leaf_{t}(x)" for t in range(len(trees)))
+        parts.append(f"def predict(x):\n    return ({calls}) / {len(trees)}")
+        parts.append(f"def leaf(x):\n    return ({leaves},)")
+    else:
+        parts.append("predict = _predict_0\nleaf = _leaf_0")
+    return "\n\n\n".join(parts) + "\n"
+
+
+def load_evaluator(compiled, path, version):
+    """
+    Generated evaluator of a compiled model, as a module imported from
+    `path` (normally next to the model file). The source is written there
+    on first use and regenerated when it belongs to another version; the
+    import keeps its bytecode in __pycache__. When `path` cannot be written
+    the source is compiled in memory instead.
+    """
+    import importlib.util
+
+    module_name = f"generated_model_{version}"
+
+    def import_file():
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    if os.path.exists(path):
+        module = import_file()
+        if module.VERSION == version:
+            return module
+
+    source = generate_source(compiled, version)
+    tmp_path = None
+    try:
+        # Unique per writer: workers starting together must not share a temp file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(source)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        model_log.always("evaluator_write_failed", path=path, version=version, error=str(e))
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    else:
+        module = import_file()
+        # Bytecode cached for an older file of the same size and mtime
+        if module.VERSION == version:
+            return module
+
+    module = types.ModuleType(module_name)
+    exec(compile(source, path, "exec"), module.__dict__)
+    return module
+
+
+def attach_evaluator(compiled, path, version):
+    """
+    Attach the generated evaluator (see load_evaluator) to a compiled model,
+    leaving the NumPy path in place if it cannot be generated. Returns the model.
+    """
+    try:
+        compiled.evaluator = load_evaluator(compiled, path, version)
+    except Exception as e:
+        model_log.always("evaluator_failed", version=version, error=f"{type(e).__name__}: {e}")
+    return compiled
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import mmap
+import os
+
+import numpy as np
+
+from .model import CompiledForest, CompiledTree
+
+# File layout: MAGIC, the header length as little-endian uint64, the JSON
+# header, then the raw node arrays, each starting on an ALIGNMENT boundary.
+MAGIC = b"CARDIOM1"
+ALIGNMENT = 64
+ARRAYS = ("feature", "threshold", "left", "right", "value")
+# Explanation arrays; stored when the model has them, not part of the version
+OPTIONAL_ARRAYS = ("bias", "contribution")
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def model_version(compiled):
+    """
+    Short content hash of a compiled model's node arrays.
+    """
+    digest = hashlib.sha256()
+    for name in ARRAYS:
+        digest.update(np.ascontiguousarray(getattr(compiled, name)).tobytes())
+    return digest.hexdigest()[:12]
+
+
+def save_model_file(path, compiled, metadata=None):
+    """
+    Write a CompiledTree or CompiledForest as a flat binary model file.
+    `metadata` (feature schema, training metrics, ...) is stored in the JSON
+    header next to the array layout, the model kind and its version.
+    Returns the header.
+    """
+    arrays = {
+        name: np.ascontiguousarray(getattr(compiled, name))
+        for name in ARRAYS + OPTIONAL_ARRAYS
+        if getattr(compiled, name, None) is not None
+    }
+    header = dict(metadata or {})
+    header["kind"] = "forest" if isinstance(compiled, CompiledForest) else "tree"
+    header["version"] = model_version(compiled)
+
+    # Array offsets are relative to the end of the (padded) header
+    layout, offset = {}, 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+    header["arrays"] = layout
+
+    encoded = json.dumps(header).encode("utf-8")
+    data_start = _aligned(len(MAGIC) + 8 + len(encoded))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, "little"))
+        f.write(encoded)
+        for name, array in arrays.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+    # Readers never see a partially written model
+    os.replace(tmp_path, path)
+    return header
+
+
+def load_model_file(path):
+    """
+    Memory-map a model file written by save_model_file.
+    The node arrays are read-only views of the mapping, so every process
+    that loads the same file shares its pages. Returns (compiled, header).
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if buffer[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a model file")
+    header_length = int.from_bytes(buffer[len(MAGIC):len(MAGIC) + 8], "little")
+    header_start = len(MAGIC) + 8
+    header = json.loads(buffer[header_start:header_start + header_length].decode("utf-8"))
+    data_start = _aligned(header_start + header_length)
+
+    arrays = {}
+    for name in ARRAYS + OPTIONAL_ARRAYS:
+        spec = header["arrays"].get(name)
+        if spec is None:
+            continue
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"]))
+        arrays[name] = np.frombuffer(
+            buffer, dtype=dtype, count=count, offset=data_start + spec["offset"]
+        ).reshape(spec["shape"])
+
+    model_class = CompiledForest if header["kind"] == "forest" else CompiledTree
+    return model_class(**arrays), header
+
+
+if __name__ == "__main__":
+    # Convert a pickled model:
+    #   python -m src.model_file models/cardio_model.pkl models/cardio_model.bin [processed.csv [metrics.json]]
+    # Trees pickled without node stats get them from the training part of
+    # train.py's holdout split of the processed CSV, if given, so the
+    # converted model can explain its predictions. The model is then
+    # evaluated on the holdout rows; the metrics go into the header and, if a
+    # path is given, a metrics report.
+    import pickle
+    import sys
+
+    from .dataset import load_dataset
+    from .features import FEATURES, TARGET
+    from .model import compile_model, fill_node_stats
+    from .train import THRESHOLD, evaluate, metrics_report, split_holdout
+
+    with open(sys.argv[1], "rb") as f:
+        trained = pickle.load(f)
+    compiled = compile_model(trained, len(FEATURES))
+    metadata = {"features": FEATURES, "target": TARGET}
+    report = None
+    if len(sys.argv) > 3:
+        X, y, _ = load_dataset(sys.argv[3], TARGET)
+        X_train, X_test, y_train, y_test = split_holdout(np.asarray(X), y)
+        train = np.column_stack((X_train, y_train))
+        for tree in trained if isinstance(trained, list) else [trained]:
+            fill_node_stats(tree, train)
+        compiled = compile_model(trained, len(FEATURES))
+        metrics, test_counts = evaluate(compiled, X_train, y_train, X_test, y_test)
+        metadata.update(threshold=THRESHOLD, metrics=metrics)
+        report = metrics_report(trained, test_counts, metrics, [], None)
+        # A converted model has no CV results or training time to report
+        for key in ("trainingSeconds", "cvResults", "trainingHistory"):
+            del report[key]
+    header = save_model_file(sys.argv[2], compiled, metadata)
+    print(f"Wrote {sys.argv[2]} (version {header['version']})")
+
+    if report is not None and len(sys.argv) > 4:
+        with open(sys.argv[4], "w") as f:
+            json.dump(dict(report, version=header["version"]), f, indent=2)
+        print(f"Wrote {sys.argv[4]}")
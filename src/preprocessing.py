@@ -1,11 +1,23 @@
 import pandas as pd
 
-def preprocess_data(output_path):
+from .dataset import build_cache, clean_columns
+from .features import TARGET, features_from_raw
+
+def preprocess_raw(raw_path, output_path):
+    # Derive the engineered features from the raw dataset (semicolon-separated)
+    # with the same feature pipeline the API uses for serving
+    raw = pd.read_csv(raw_path, sep=";")
+    features_from_raw(raw).to_csv(output_path, index=False)
+    print(f"Engineered dataset written to {output_path}")
+
+    preprocess_data(output_path)
+
+def preprocess_data(output_path, target=TARGET):
     # Read FINAL dataset (comma-separated)
     df = pd.read_csv(output_path)
 
     # 🔥 Drop unwanted unnamed index columns
-    df = df.loc[:, ~df.columns.str.contains("^unnamed")]
+    df = clean_columns(df)
 
     print("Final engineered dataset cleaned.")
     print("Columns:", df.columns.tolist())
@@ -14,7 +26,12 @@ def preprocess_data(output_path):
     # OPTIONAL: save cleaned file back (recommended)
     df.to_csv(output_path, index=False)
 
+    # Binary columnar cache that train.py memory-maps instead of parsing the CSV
+    build_cache(output_path, target)
+    print("Binary dataset cache written.")
+
 if __name__ == "__main__":
-    preprocess_data(
-        output_path="data/processed/CardioPreprocessing.csv"
+    preprocess_raw(
+        raw_path="data/raw/cardio_train.csv",
+        output_path="data/processed/CardioPreprocessed.csv"
     )
@@ -0,0 +1,277 @@
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .model import attach_evaluator
+from .metrics import REGISTRY as metrics_registry
+from .model_file import load_model_file
+
+# A registry is a directory of model files named <version>.bin plus pointer
+# files holding the version that is live (CURRENT) or being shadow-tested
+# (CANDIDATE). Pointers are replaced atomically, so readers never see a
+# half-written one.
+CURRENT = "CURRENT"
+CANDIDATE = "CANDIDATE"
+
+MODEL_LOAD_SECONDS = metrics_registry.histogram(
+    "cardio_model_load_seconds", "Time to load a model, including its generated evaluator.", ["source", "result"]
+)
+
+
+def artifact_path(directory, version):
+    return os.path.join(directory, f"{version}.bin")
+
+
+def read_pointer(directory, name=CURRENT):
+    """
+    Version a pointer names, or None if the pointer does not exist.
+    """
+    try:
+        with open(os.path.join(directory, name)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def set_pointer(directory, version, name=CURRENT):
+    if not os.path.exists(artifact_path(directory, version)):
+        raise ValueError(f"Version {version} is not in the registry {directory}")
+    tmp_path = os.path.join(directory, f".{name}.tmp")
+    with open(tmp_path, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+def clear_pointer(directory, name=CANDIDATE):
+    try:
+        os.remove(os.path.join(directory, name))
+    except FileNotFoundError:
+        pass
+
+
+def metrics_path(directory, version):
+    return os.path.join(directory, f"{version}.json")
+
+
+def evaluator_path(directory, version):
+    return os.path.join(directory, f"{version}.py")
+
+
+def list_versions(directory):
+    """
+    Versions in the registry, oldest first.
+    """
+    if not os.path.isdir(directory):
+        return []
+    files = [name for name in os.listdir(directory) if name.endswith(".bin")]
+    files.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)))
+    return [name[:-len(".bin")] for name in files]
+
+
+def _copy_atomic(source, destination):
+    tmp_path = destination + ".tmp"
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def publish(directory, model_file_path, pointer=CURRENT, metrics_file_path=None):
+    """
+    Copy a model file (see model_file.py) into the registry under its version,
+    with its metrics report if given, and unless `pointer` is None point
+    CURRENT or CANDIDATE at it. Returns the version.
+    """
+    _, header = load_model_file(model_file_path)
+    version = header["version"]
+    os.makedirs(directory, exist_ok=True)
+
+    path = artifact_path(directory, version)
+    if not os.path.exists(path):
+        _copy_atomic(model_file_path, path)
+    if metrics_file_path is not None:
+        _copy_atomic(metrics_file_path, metrics_path(directory, version))
+    if pointer is not None:
+        set_pointer(directory, version, pointer)
+    return version
+
+
+class LiveModel:
+    """
+    The model a registry pointer names, reloaded when the pointer moves.
+    `loaded` is a (model, version, header) tuple, or None before the first
+    load, and is swapped in a single assignment: a request that reads it once
+    keeps using the same model even if a reload lands while it runs.
+    With `codegen`, each model gets its generated single-row evaluator
+    (see model.load_evaluator) before it is swapped in.
+    """
+
+    def __init__(self, directory, pointer=CURRENT, features=None, codegen=False):
+        self.directory = directory
+        self.pointer = pointer
+        self.features = features
+        self.codegen = codegen
+        self.loaded = None
+        self.reloads = 0
+        self.last_error = None
+
+    @property
+    def version(self):
+        loaded = self.loaded
+        return None if loaded is None else loaded[1]
+
+    def refresh(self):
+        """
+        Load the pointed-to version if it differs from the loaded one.
+        A model that fails to load or was trained on other features is
+        reported and skipped; the previous model stays in place.
+        Returns True if a new model was swapped in.
+        """
+        version = read_pointer(self.directory, self.pointer)
+        if version is None or version == self.version:
+            return False
+        start = time.perf_counter()
+        try:
+            model, header = load_model_file(artifact_path(self.directory, version))
+            if self.features is not None and header.get("features", self.features) != self.features:
+                raise ValueError("model was trained on different features")
+        except Exception as e:
+            MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, self.pointer, "error")
+            if self.last_error != (version, str(e)):
+                print(f"Could not load {self.pointer} model {version}: {e}")
+            self.last_error = (version, str(e))
+            return False
+
+        if self.codegen:
+            attach_evaluator(model, evaluator_path(self.directory, version), version)
+        MODEL_LOAD_SECONDS.observe(time.perf_counter() - start, self.pointer, "ok")
+        self.loaded = (model, header["version"], header)
+        self.reloads += 1
+        self.last_error = None
+        print(f"{self.pointer} model is now version {header['version']}")
+        return True
+
+
+def watch(live_models, interval):
+    """
+    Refresh `live_models` every `interval` seconds on a daemon thread, so
+    loading a new model never happens on a request. Returns an Event that
+    stops the thread when set.
+    """
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            for live_model in live_models:
+                live_model.refresh()
+
+    threading.Thread(target=run, name="model-registry-watcher", daemon=True).start()
+    return stop
+
+
+class ShadowScorer:
+    """
+    Scores requests with a candidate model on a background thread and keeps
+    running statistics of how its outputs compare with the live model's.
+    At most `max_pending` jobs are queued; beyond that requests are dropped
+    rather than delaying anything.
+    """
+
+    def __init__(self, candidate, categorize, max_pending=1000):
+        self.candidate = candidate
+        self.categorize = categorize
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.versions = (None, None)
+        self.compared = 0
+        self.dropped = 0
+        self.agreements = 0
+        self.total_abs_diff = 0.0
+        self.max_abs_diff = 0.0
+
+    def submit(self, features, primary_scores, primary_version):
+        """
+        Queue a feature vector or matrix scored by the live model as
+        `primary_scores` for scoring by the candidate.
+        """
+        if self.candidate.loaded is None:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending += 1
+        self._executor.submit(self._score, features, primary_scores, primary_version)
+
+    def _score(self, features, primary_scores, primary_version):
+        try:
+            primary_scores = np.asarray(primary_scores, dtype=np.float64).reshape(-1)
+            candidate, candidate_version, _ = self.candidate.loaded
+            candidate_scores = candidate.predict_batch(features)
+            diff = np.abs(candidate_scores - primary_scores)
+            agreements = sum(
+                self.categorize(a) == self.categorize(b)
+                for a, b in zip(candidate_scores, primary_scores)
+            )
+            with self._lock:
+                # Comparisons of an older pair of models no longer apply
+                if (primary_version, candidate_version) != self.versions:
+                    self._reset()
+                    self.versions = (primary_version, candidate_version)
+                self.compared += len(diff)
+                self.agreements += int(agreements)
+                self.total_abs_diff += float(diff.sum())
+                self.max_abs_diff = max(self.max_abs_diff, float(diff.max()))
+        except Exception as e:
+            print(f"Shadow scoring error: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _reset(self):
+        self.compared = 0
+        self.agreements = 0
+        self.total_abs_diff = 0.0
+        self.max_abs_diff = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "primaryVersion": self.versions[0],
+                "candidateVersion": self.versions[1],
+                "compared": self.compared,
+                "dropped": self.dropped,
+                "pending": self._pending,
+                "categoryAgreement": self.agreements / self.compared if self.compared else None,
+                "meanAbsDiff": self.total_abs_diff / self.compared if self.compared else None,
+                "maxAbsDiff": self.max_abs_diff,
+            }
+
+
+if __name__ == "__main__":
+    # python -m src.registry list | publish <file> [current|candidate] | promote <version>
+    #                              | candidate <version> | clear-candidate   (registry: MODEL_REGISTRY_DIR)
+    import sys
+
+    directory = os.environ.get("MODEL_REGISTRY_DIR", "models/registry")
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == "list":
+        current, candidate = read_pointer(directory, CURRENT), read_pointer(directory, CANDIDATE)
+        for version in list_versions(directory):
+            marks = [name for name, pointed in ((CURRENT, current), (CANDIDATE, candidate)) if pointed == version]
+            print(version, " ".join(marks))
+    elif command == "publish":
+        pointer = args[1].upper() if len(args) > 1 else CURRENT
+        print(publish(directory, args[0], pointer))
+    elif command == "promote":
+        set_pointer(directory, args[0], CURRENT)
+    elif command == "candidate":
+        set_pointer(directory, args[0], CANDIDATE)
+    elif command == "clear-candidate":
+        clear_pointer(directory, CANDIDATE)
+    else:
+        raise SystemExit(f"Unknown command: {command}")
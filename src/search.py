@@ -0,0 +1,66 @@
+import time
+
+import numpy as np
+
+
+def successive_halving(configs, evaluate, n_folds, eta=3, min_folds=1):
+    """
+    Race hyperparameter configs over cross-validation folds.
+    Every surviving config is scored on the same folds; after each rung only
+    the best 1/eta (by mean fold score, ties kept in `configs` order) survive
+    and get eta times as many folds, until the survivors have seen all folds.
+
+    configs: list of config tuples, e.g. (max_depth, min_size)
+    evaluate(configs, folds): returns {config + (fold,): (score, seconds)}
+
+    Returns the best config (scored on every fold), the fold scores and fold
+    seconds of every config as far as it got, and a report of the compute
+    used and saved. Costs are the wall time of the evaluate calls; the
+    exhaustive cost is the first rung, where every config runs, scaled to all
+    folds. That holds however `evaluate` shares work between configs, e.g.
+    one tree per fold for all of them.
+    """
+    fold_scores = {config: [] for config in configs}
+    fold_seconds = {config: [] for config in configs}
+    survivors = list(configs)
+    position = {config: index for index, config in enumerate(configs)}
+    rungs = []
+    budget = min(min_folds, n_folds)
+
+    while True:
+        folds = list(range(len(fold_scores[survivors[0]]), budget))
+        start = time.perf_counter()
+        results = evaluate(survivors, folds)
+        rung_seconds = time.perf_counter() - start
+        for config in survivors:
+            for fold in folds:
+                score, seconds = results[config + (fold,)]
+                fold_scores[config].append(score)
+                fold_seconds[config].append(seconds)
+        rungs.append({"configs": len(survivors), "folds": budget, "seconds": rung_seconds})
+
+        if budget == n_folds:
+            break
+        survivors = sorted(survivors, key=lambda config: (-np.mean(fold_scores[config]), position[config]))
+        survivors = survivors[:max(1, len(survivors) // eta)]
+        budget = min(budget * eta, n_folds)
+
+    best_config, best_score = None, None
+    for config in configs:
+        if config in survivors:
+            score = np.mean(fold_scores[config])
+            if best_score is None or score > best_score:
+                best_config, best_score = config, score
+
+    evaluations = sum(len(scores) for scores in fold_scores.values())
+    seconds = sum(rung["seconds"] for rung in rungs)
+    exhaustive_seconds = rungs[0]["seconds"] / rungs[0]["folds"] * n_folds
+    report = {
+        "rungs": rungs,
+        "evaluations": evaluations,
+        "exhaustive_evaluations": len(configs) * n_folds,
+        "seconds": seconds,
+        "estimated_exhaustive_seconds": exhaustive_seconds,
+        "estimated_seconds_saved": max(0.0, exhaustive_seconds - seconds),
+    }
+    return best_config, fold_scores, fold_seconds, report
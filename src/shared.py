@@ -0,0 +1,35 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+
+def share_array(array):
+    """
+    Copy an array into a new shared memory block.
+    Returns the block (the caller must close and unlink it) and a small,
+    picklable spec that worker processes pass to attach_array.
+    """
+    array = np.ascontiguousarray(array)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def attach_array(spec):
+    """
+    Map an array shared with share_array without copying it.
+    Meant for pool workers, which share the parent's resource tracker, so the
+    block is still unlinked exactly once by release in the parent.
+    Keep the returned block alive for as long as the array is used.
+    """
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+
+def release(blocks):
+    """
+    Close and unlink shared memory blocks created by share_array.
+    """
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
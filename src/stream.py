@@ -0,0 +1,194 @@
+import numpy as np
+import pandas as pd
+
+from .dataset import clean_columns, split_features
+from .model import descend, weighted_gini
+
+
+def read_chunks(path, target, chunksize=100_000, holdout=0, train=True):
+    """
+    Stream (X, y) chunks of a processed CSV, cleaned like train.main does.
+    With `holdout` > 0 every holdout-th row of the file is held out: `train`
+    selects whether the chunks keep the other rows or only those.
+    """
+    offset = 0
+    for df in pd.read_csv(path, chunksize=chunksize):
+        features, labels = split_features(clean_columns(df), target)
+        X = features.values.astype(np.float64)
+        y = labels.values.astype(np.float64)
+        if holdout:
+            held_out = (np.arange(offset, offset + len(df)) % holdout) == 0
+            keep = ~held_out if train else held_out
+            X, y = X[keep], y[keep]
+        offset += len(df)
+        yield X, y
+
+
+def scan_bins(chunks, max_bins=255, sample_size=1_000_000, random_state=0):
+    """
+    One pass over the data to find per-feature bin thresholds and the classes.
+    Features with at most `max_bins` unique values keep every unique value;
+    wider features use the quantiles of a reservoir sample of `sample_size`
+    rows, so the result matches bin_dataset when the sample holds every row.
+    """
+    rng = np.random.default_rng(random_state)
+    sample, seen = None, 0
+    unique_values, classes = None, np.array([])
+
+    for X, y in chunks:
+        if sample is None:
+            sample = np.empty((0, X.shape[1]))
+            unique_values = [np.array([]) for _ in range(X.shape[1])]
+        classes = np.union1d(classes, y)
+
+        # Narrow features keep exact unique values; stop tracking once too wide
+        for index, values in enumerate(unique_values):
+            if values is not None:
+                values = np.union1d(values, X[:, index])
+                unique_values[index] = values if len(values) <= max_bins else None
+
+        # Reservoir sampling (Algorithm R), one chunk at a time
+        take = min(sample_size - len(sample), len(X))
+        if take:
+            sample = np.concatenate((sample, X[:take]))
+        slots = rng.integers(0, np.arange(seen + take, seen + len(X)) + 1)
+        replace = slots < sample_size
+        sample[slots[replace]] = X[take:][replace]
+        seen += len(X)
+
+    thresholds = []
+    for index, values in enumerate(unique_values):
+        if values is None:
+            values = np.unique(np.percentile(sample[:, index], np.linspace(0, 100, max_bins + 2)[1:-1]))
+        thresholds.append(values)
+    return thresholds, classes, seen
+
+
+def weighted_impurity(counts):
+    """
+    Gini impurity of a node with these class counts, times its sample count.
+    """
+    n_samples = counts.sum()
+    return n_samples - np.sum(counts ** 2) / n_samples if n_samples else 0.0
+
+
+def best_split_from_hist(hist, thresholds):
+    """
+    Pick the best split of one node from its (feature, bin, class) histogram,
+    with the same scoring and tie-breaking as get_best_split_hist.
+    Returns (feature, bin, left class counts, right class counts).
+    """
+    best = None
+    best_score = 1.0
+    for index, edges in enumerate(thresholds):
+        counts = hist[index, :len(edges) + 1]
+        left_counts = np.cumsum(counts, axis=0)[:-1]
+        right_counts = left_counts[-1] + counts[-1] - left_counts
+        gini = weighted_gini(left_counts, right_counts)
+
+        candidate = int(np.argmin(gini))
+        if gini[candidate] < best_score:
+            best = (index, candidate, left_counts[candidate], right_counts[candidate])
+            best_score = gini[candidate]
+    return best
+
+
+def grow_streaming_tree(make_chunks, max_depth, min_size, max_bins=255,
+                        sample_size=1_000_000, max_nodes_per_pass=1024):
+    """
+    Grow a histogram-mode decision tree level by level from a re-readable
+    stream of (X, y) chunks, never holding more than one chunk of rows.
+    `make_chunks()` must return a fresh iterator over the same data.
+
+    One pass finds the bins; then each level takes one pass per
+    `max_nodes_per_pass` frontier nodes, accumulating per-node class
+    histograms. Memory is bounded by nodes x features x bins x classes.
+    The tree uses the dict format of build_tree, and equals
+    build_tree(..., max_bins) when the bin sample holds every row.
+    """
+    thresholds, classes, _ = scan_bins(make_chunks(), max_bins, sample_size)
+    n_features, n_classes = len(thresholds), len(classes)
+    width = max(len(edges) for edges in thresholds) + 1
+
+    # Routing arrays of the partial tree; frontier and terminal nodes are leaves
+    feature, threshold, left, right = [-1], [np.nan], [-1], [-1]
+    nodes = [None]
+    frontier = [(0, 1)]
+    n_passes = 1
+
+    def add_child(parent_counts, depth, next_frontier):
+        n_samples = parent_counts.sum()
+        feature.append(-1)
+        threshold.append(np.nan)
+        left.append(-1)
+        right.append(-1)
+        nodes.append(None)
+        child_id = len(feature) - 1
+        if depth is None or n_samples <= min_size:
+            nodes[child_id] = np.dot(classes, parent_counts) / n_samples
+        else:
+            next_frontier.append((child_id, depth))
+        return child_id
+
+    while frontier:
+        next_frontier = []
+        for start in range(0, len(frontier), max_nodes_per_pass):
+            batch = frontier[start:start + max_nodes_per_pass]
+            slot = np.full(len(feature), -1)
+            slot[[node_id for node_id, _ in batch]] = np.arange(len(batch))
+
+            routing = (
+                np.array(feature, dtype=np.int32), np.array(threshold),
+                np.array(left, dtype=np.int32), np.array(right, dtype=np.int32)
+            )
+            hist = np.zeros(len(batch) * n_features * width * n_classes, dtype=np.int64)
+            for X, y in make_chunks():
+                node = descend(*routing, X, np.zeros(len(X), dtype=np.intp), np.arange(len(X)))
+                rows = np.flatnonzero(slot[node] >= 0)
+                if not len(rows):
+                    continue
+                codes = np.column_stack([
+                    np.searchsorted(edges, X[rows, index], side='right')
+                    for index, edges in enumerate(thresholds)
+                ])
+                target_index = np.searchsorted(classes, y[rows])
+                flat = ((slot[node[rows], None] * n_features + np.arange(n_features)) * width + codes) * n_classes
+                hist += np.bincount((flat + target_index[:, None]).ravel(), minlength=len(hist))
+            hist = hist.reshape(len(batch), n_features, width, n_classes)
+            n_passes += 1
+
+            for position, (node_id, depth) in enumerate(batch):
+                class_counts = hist[position, 0].sum(axis=0)
+                index, candidate, left_counts, right_counts = best_split_from_hist(hist[position], thresholds)
+                node = {
+                    'index': index,
+                    'value': thresholds[index][candidate],
+                    'n_samples': int(class_counts.sum()),
+                    'leaf_value': np.dot(classes, class_counts) / class_counts.sum(),
+                    'impurity_decrease': (
+                        weighted_impurity(class_counts)
+                        - weighted_impurity(left_counts) - weighted_impurity(right_counts)
+                    ),
+                }
+                nodes[node_id] = node
+                feature[node_id], threshold[node_id] = index, node['value']
+
+                if left_counts.sum() == 0 or right_counts.sum() == 0:
+                    # no split: both children are the node's own leaf value
+                    left[node_id] = add_child(class_counts, None, next_frontier)
+                    right[node_id] = add_child(class_counts, None, next_frontier)
+                else:
+                    child_depth = depth + 1 if depth < max_depth else None
+                    left[node_id] = add_child(left_counts, child_depth, next_frontier)
+                    right[node_id] = add_child(right_counts, child_depth, next_frontier)
+        frontier = next_frontier
+
+    def assemble(node_id):
+        node = nodes[node_id]
+        if isinstance(node, dict):
+            node['left'] = assemble(left[node_id])
+            node['right'] = assemble(right[node_id])
+        return node
+
+    print(f"Streaming tree grown in {n_passes} passes over the data")
+    return assemble(0)
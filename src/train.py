@@ -1,15 +1,32 @@
-import pandas as pd
 import numpy as np
 import time
 import pickle
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from sklearn.model_selection import train_test_split, StratifiedKFold
-from .model import build_tree, predict
+from .dataset import load_dataset
+from .features import FEATURES, TARGET
+from .model import build_forest, build_tree, compile_model, compile_tree, feature_importance, truncate_tree
+from .model_file import save_model_file
+from .registry import publish
+from .search import successive_halving
+from .stream import grow_streaming_tree, read_chunks
+from .shared import attach_array, release, share_array
 
 # ---------------- CONFIGURATION ----------------
 DATA_PATH = "data/processed/CardioPreprocessed.csv"
-TARGET = "cardio"
+MODEL_PATH = "models/cardio_model.pkl"
+# Compact binary copy of the model that the API memory-maps (see model_file.py)
+MODEL_FILE_PATH = "models/cardio_model.bin"
+# Evaluation report served by /api/model/metrics
+MODEL_METRICS_PATH = "models/cardio_metrics.json"
+# Every trained model is also published to this registry directory, and the
+# pointer named here moved to it: "CURRENT" makes running APIs hot-reload it,
+# "CANDIDATE" shadow-scores it next to the live model, None only stores it
+MODEL_REGISTRY_DIR = "models/registry"
+PUBLISH_POINTER = "CURRENT"
 THRESHOLD = 0.5
 
 # Hyperparameter search space
@@ -17,16 +34,61 @@ MAX_DEPTHS = [5, 10, 15, 20]
 MIN_SIZES = [20, 50, 100]
 K_FOLDS = 5
 RANDOM_STATE = 42
+
+# Histogram split search: features are binned once into at most MAX_BINS
+# integer bins. Set to None to use the per-node percentile search instead.
+MAX_BINS = 255
+
+# Worker processes used to grow subtrees of each tree (1 = serial build)
+N_JOBS = 1
+
+# Worker processes running cross-validation jobs in parallel (1 = serial).
+# Each job then builds its tree serially, whatever N_JOBS is.
+CV_JOBS = 1
+
+# Grow only the deepest, smallest-min_size tree of the grid once per fold and
+# derive every other config by truncating it (False = build every config)
+PRUNE_SEARCH = True
+
+# "grid" scores every MAX_DEPTHS x MIN_SIZES config on all folds; "halving"
+# races the wider HALVING_* grid with successive halving over the folds,
+# keeping the best 1/HALVING_ETA of configs per rung
+SEARCH = "grid"
+HALVING_MAX_DEPTHS = [4, 6, 8, 10, 12, 14, 16, 18, 20, 24]
+HALVING_MIN_SIZES = [5, 10, 20, 50, 100, 200, 500]
+HALVING_ETA = 3
+
+# "tree" saves a single decision tree; "forest" saves N_TREES bootstrap trees
+# grown with the cross-validated depth and min size, trying MAX_FEATURES
+# features per split. Forest trees are spread over N_JOBS worker processes.
+MODEL_TYPE = "tree"
+N_TREES = 100
+MAX_FEATURES = "sqrt"
+
+# Out-of-core training: grow one histogram tree straight from DATA_PATH,
+# STREAM_CHUNK_SIZE rows at a time, with fixed hyperparameters (no CV).
+# Every K_FOLDS-th row of the file is held out for evaluation.
+STREAMING = False
+STREAM_CHUNK_SIZE = 100_000
+STREAM_MAX_DEPTH = 10
+STREAM_MIN_SIZE = 50
 # ------------------------------------------------
 
 
-def calculate_metrics(y_true, y_pred):
+def confusion_counts(y_true, y_pred):
     tp = np.sum((y_pred == 1) & (y_true == 1))
     tn = np.sum((y_pred == 0) & (y_true == 0))
     fp = np.sum((y_pred == 1) & (y_true == 0))
     fn = np.sum((y_pred == 0) & (y_true == 1))
+    return tp, tn, fp, fn
+
+
+def calculate_metrics(y_true, y_pred):
+    return metrics_from_counts(*confusion_counts(y_true, y_pred))
 
-    accuracy = (tp + tn) / len(y_true)
+
+def metrics_from_counts(tp, tn, fp, fn):
+    accuracy = (tp + tn) / (tp + tn + fp + fn)
     precision = tp / (tp + fp) if (tp + fp) > 0 else 0
     recall = tp / (tp + fn) if (tp + fn) > 0 else 0
     f1 = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
@@ -34,9 +96,124 @@ def calculate_metrics(y_true, y_pred):
     return accuracy, precision, recall, f1
 
 
+def evaluate_fold(data, fold_ids, fold, max_depth, min_size, n_jobs=1):
+    """
+    Grow one tree on every fold but `fold` and score it on `fold`.
+    Returns the validation accuracy and the seconds the job took.
+    """
+    start_time = time.time()
+    train_idx = np.flatnonzero(fold_ids != fold)
+    val_idx = np.flatnonzero(fold_ids == fold)
+
+    tree = build_tree(
+        data, max_depth, min_size,
+        max_bins=MAX_BINS, rows=train_idx, n_jobs=n_jobs
+    )
+
+    probs = compile_tree(tree).predict_batch(data[val_idx, :-1])
+    preds = (probs >= THRESHOLD).astype(int)
+
+    acc, _, _, _ = calculate_metrics(data[val_idx, -1], preds)
+    return acc, time.time() - start_time
+
+
+def evaluate_fold_pruned(data, fold_ids, fold, configs, n_jobs=1):
+    """
+    Grow the largest tree of `configs` once on every fold but `fold` and score
+    each (max_depth, min_size) config on `fold` as a truncation of it.
+    Returns {(max_depth, min_size, fold): (accuracy, seconds)}; the build
+    time is spread evenly over the configs.
+    """
+    start_time = time.time()
+    train_idx = np.flatnonzero(fold_ids != fold)
+    val_idx = np.flatnonzero(fold_ids == fold)
+    X_val, y_val = data[val_idx, :-1], data[val_idx, -1]
+
+    full_tree = build_tree(
+        data,
+        max(max_depth for max_depth, _ in configs),
+        min(min_size for _, min_size in configs),
+        max_bins=MAX_BINS, rows=train_idx, n_jobs=n_jobs
+    )
+    build_seconds = (time.time() - start_time) / len(configs)
+
+    results = {}
+    for max_depth, min_size in configs:
+        start_time = time.time()
+        tree = truncate_tree(full_tree, max_depth, min_size)
+        probs = compile_tree(tree).predict_batch(X_val)
+        preds = (probs >= THRESHOLD).astype(int)
+
+        acc, _, _, _ = calculate_metrics(y_val, preds)
+        results[(max_depth, min_size, fold)] = (acc, build_seconds + time.time() - start_time)
+    return results
+
+
+# Per-process state of cross-validation workers, set by _init_cv_worker
+_cv_worker = {}
+
+
+def _init_cv_worker(data_spec, fold_ids_spec):
+    data_shm, data = attach_array(data_spec)
+    fold_shm, fold_ids = attach_array(fold_ids_spec)
+    _cv_worker.update(blocks=(data_shm, fold_shm), data=data, fold_ids=fold_ids)
+
+
+def _cv_job(job, args):
+    return job(_cv_worker["data"], _cv_worker["fold_ids"], *args)
+
+
+def evaluate_config(data, fold_ids, max_depth, min_size, fold, n_jobs=1):
+    """
+    Score one config on one fold, keyed like the results of evaluate_fold_pruned.
+    """
+    return {(max_depth, min_size, fold): evaluate_fold(data, fold_ids, fold, max_depth, min_size, n_jobs)}
+
+
+def run_cv_grid(data, fold_ids, configs, folds, n_jobs=1, prune=False):
+    """
+    Score every (max_depth, min_size) config in `configs` on every fold in `folds`.
+    With `prune`, there is one job per fold that scores all configs from a
+    single tree (see evaluate_fold_pruned).
+    With n_jobs > 1 the jobs run in worker processes that map the data and
+    fold assignment from shared memory instead of receiving copies.
+    Returns {(max_depth, min_size, fold): (accuracy, seconds)}.
+    """
+    if prune:
+        jobs = [(evaluate_fold_pruned, (fold, configs)) for fold in folds]
+    else:
+        jobs = [
+            (evaluate_config, (max_depth, min_size, fold))
+            for max_depth, min_size in configs
+            for fold in folds
+        ]
+
+    results = {}
+    if n_jobs <= 1:
+        for job, args in jobs:
+            results.update(job(data, fold_ids, *args, n_jobs=N_JOBS))
+        return results
+
+    data_shm, data_spec = share_array(data)
+    fold_shm, fold_ids_spec = share_array(fold_ids)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_cv_worker,
+            initargs=(data_spec, fold_ids_spec)
+        ) as pool:
+            futures = [pool.submit(_cv_job, job, args) for job, args in jobs]
+            for future in as_completed(futures):
+                results.update(future.result())
+            return results
+    finally:
+        release([data_shm, fold_shm])
+
+
 def cross_validate(X, y):
     """
     Perform Stratified K-Fold Cross Validation to find best hyperparameters
+    Returns the best (max_depth, min_size) and the per-config CV results.
     """
     skf = StratifiedKFold(
         n_splits=K_FOLDS,
@@ -47,88 +224,262 @@ def cross_validate(X, y):
     best_accuracy = 0
     best_params = None
 
+    # One shared training matrix; each fold's tree is grown on row indices
+    data = np.column_stack((X, y))
+    fold_ids = np.empty(len(y), dtype=np.int8)
+    for fold, (_, val_idx) in enumerate(skf.split(X, y)):
+        fold_ids[val_idx] = fold
+
     print("\n Starting Stratified K-Fold Cross Validation...\n")
 
-    for max_depth in MAX_DEPTHS:
-        for min_size in MIN_SIZES:
-            fold_accuracies = []
+    def evaluate(configs, folds):
+        return run_cv_grid(data, fold_ids, configs, folds, n_jobs=CV_JOBS, prune=PRUNE_SEARCH)
+
+    start_time = time.time()
+    if SEARCH == "halving":
+        configs = [(max_depth, min_size) for max_depth in HALVING_MAX_DEPTHS for min_size in HALVING_MIN_SIZES]
+        _, fold_scores, fold_times, report = successive_halving(
+            configs, evaluate, K_FOLDS, eta=HALVING_ETA
+        )
+    else:
+        configs = [(max_depth, min_size) for max_depth in MAX_DEPTHS for min_size in MIN_SIZES]
+        grid = evaluate(configs, range(K_FOLDS))
+        fold_scores = {config: [grid[config + (fold,)][0] for fold in range(K_FOLDS)] for config in configs}
+        fold_times = {config: [grid[config + (fold,)][1] for fold in range(K_FOLDS)] for config in configs}
+        report = None
+
+    cv_results = []
+    for max_depth, min_size in configs:
+        fold_accuracies = fold_scores[(max_depth, min_size)]
+        fold_seconds = fold_times[(max_depth, min_size)]
+        mean_acc = np.mean(fold_accuracies)
+
+        print(
+            f"Depth={max_depth}, MinSize={min_size} "
+            f"→ CV Accuracy={mean_acc:.4f} "
+            f"(folds: {', '.join(f'{acc:.4f}' for acc in fold_accuracies)}; "
+            f"{sum(fold_seconds):.2f}s)"
+        )
+
+        cv_results.append({
+            "max_depth": max_depth,
+            "min_size": min_size,
+            "fold_accuracies": fold_accuracies,
+            "fold_seconds": fold_seconds,
+            "mean_accuracy": mean_acc,
+        })
+
+        # Only configs scored on every fold can win
+        if len(fold_accuracies) == K_FOLDS and mean_acc > best_accuracy:
+            best_accuracy = mean_acc
+            best_params = (max_depth, min_size)
+
+    print(f"\n Cross validation took {time.time() - start_time:.2f} seconds "
+          f"({CV_JOBS} worker(s))")
+    if report is not None:
+        rungs = " → ".join(f"{rung['configs']} configs x {rung['folds']} folds" for rung in report["rungs"])
+        print(f" Successive halving: {rungs}")
+        print(
+            f" Ran {report['evaluations']} of {report['exhaustive_evaluations']} fold evaluations, "
+            f"in {report['seconds']:.2f} seconds; the full grid would take an estimated "
+            f"{report['estimated_exhaustive_seconds']:.2f}"
+        )
+    print("\n Best Hyperparameters Found:")
+    print(f"Max Depth : {best_params[0]}")
+    print(f"Min Size  : {best_params[1]}")
+    print(f"Best CV Accuracy : {best_accuracy:.4f}")
 
-            for train_idx, val_idx in skf.split(X, y):
-                X_train, X_val = X[train_idx], X[val_idx]
-                y_train, y_val = y[train_idx], y[val_idx]
+    return best_params, cv_results
 
-                train_data = np.column_stack((X_train, y_train))
-                tree = build_tree(train_data, max_depth, min_size)
 
-                probs = np.array([predict(tree, row) for row in X_val])
-                preds = (probs >= THRESHOLD).astype(int)
+def split_holdout(X, y):
+    """
+    The stratified train/test split every model is evaluated on.
+    """
+    return train_test_split(X, y, test_size=0.2, stratify=y, random_state=RANDOM_STATE)
 
-                acc, _, _, _ = calculate_metrics(y_val, preds)
-                fold_accuracies.append(acc)
 
-            mean_acc = np.mean(fold_accuracies)
+def evaluate(compiled_model, X_train, y_train, X_test, y_test):
+    """
+    Train and test metrics of a compiled model, and its test confusion counts.
+    """
+    train_preds = (compiled_model.predict_batch(X_train) >= THRESHOLD).astype(int)
+    test_preds = (compiled_model.predict_batch(X_test) >= THRESHOLD).astype(int)
 
-            print(
-                f"Depth={max_depth}, MinSize={min_size} "
-                f"→ CV Accuracy={mean_acc:.4f}"
-            )
+    tr_acc, tr_prec, tr_rec, tr_f1 = calculate_metrics(y_train, train_preds)
+    te_acc, te_prec, te_rec, te_f1 = calculate_metrics(y_test, test_preds)
+    metrics = {
+        "train": {"accuracy": tr_acc, "precision": tr_prec, "recall": tr_rec, "f1": tr_f1},
+        "test": {"accuracy": te_acc, "precision": te_prec, "recall": te_rec, "f1": te_f1},
+    }
+    return metrics, confusion_counts(y_test, test_preds)
 
-            if mean_acc > best_accuracy:
-                best_accuracy = mean_acc
-                best_params = (max_depth, min_size)
 
-    print("\n Best Hyperparameters Found:")
-    print(f"Max Depth : {best_params[0]}")
-    print(f"Min Size  : {best_params[1]}")
-    print(f"Best CV Accuracy : {best_accuracy:.4f}")
+def metrics_report(final_model, test_counts, metrics, cv_results, training_seconds):
+    """
+    The evaluation report written next to the model, in the shape the
+    dashboard reads from /api/model/metrics: test metrics and confusion
+    matrix, per-config CV results, training time and feature importance.
+    """
+    tp, tn, fp, fn = (int(count) for count in test_counts)
+    test = metrics["test"]
+    importance = feature_importance(final_model, len(FEATURES))
+    return {
+        "accuracy": test["accuracy"],
+        "precision": test["precision"],
+        "recall": test["recall"],
+        "f1": test["f1"],
+        "metrics": metrics,
+        "confusionMatrix": [
+            {"actual": "Positive", "TP": tp, "FN": fn},
+            {"actual": "Negative", "FP": fp, "TN": tn},
+        ],
+        "trainingSeconds": training_seconds,
+        "cvResults": [
+            {
+                "maxDepth": result["max_depth"],
+                "minSize": result["min_size"],
+                "foldAccuracies": [float(acc) for acc in result["fold_accuracies"]],
+                "foldSeconds": [float(sec) for sec in result["fold_seconds"]],
+                "meanAccuracy": float(result["mean_accuracy"]),
+            }
+            for result in cv_results
+        ],
+        # One point per cross-validated config; loss is the CV error rate
+        "trainingHistory": [
+            {
+                "epoch": position + 1,
+                "config": f"depth {result['max_depth']}, min size {result['min_size']}",
+                "accuracy": float(result["mean_accuracy"]),
+                "loss": 1.0 - float(result["mean_accuracy"]),
+            }
+            for position, result in enumerate(cv_results)
+        ],
+        "featureImportance": sorted(
+            ({"name": name, "value": float(value)} for name, value in zip(FEATURES, importance)),
+            key=lambda feature: feature["value"], reverse=True
+        ),
+    }
+
+
+def save_model(final_model, metrics=None, params=None, report=None):
+    """
+    Save the trained model twice: pickled, and compiled into the flat binary
+    format the API memory-maps, with the feature schema and metrics in its
+    header. The evaluation `report` (see metrics_report) goes next to them.
+    """
+    os.makedirs("models", exist_ok=True)
+    with open(MODEL_PATH, "wb") as f:
+        pickle.dump(final_model, f)
+
+    header = save_model_file(MODEL_FILE_PATH, compile_model(final_model, len(FEATURES)), {
+        "features": FEATURES,
+        "target": TARGET,
+        "threshold": THRESHOLD,
+        "model_type": "forest" if isinstance(final_model, list) else "tree",
+        "params": params or {},
+        "metrics": metrics or {},
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    })
+
+    print(f"\n✅ Best model saved to {MODEL_PATH} and {MODEL_FILE_PATH} (version {header['version']})")
+
+    metrics_path = None
+    if report is not None:
+        report = dict(report, version=header["version"], params=header["params"], trainedAt=header["trained_at"])
+        tmp_path = MODEL_METRICS_PATH + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, MODEL_METRICS_PATH)
+        metrics_path = MODEL_METRICS_PATH
+        print(f"Metrics report saved to {MODEL_METRICS_PATH}")
+
+    publish(MODEL_REGISTRY_DIR, MODEL_FILE_PATH, PUBLISH_POINTER, metrics_path)
+    pointer = f" as {PUBLISH_POINTER}" if PUBLISH_POINTER else ""
+    print(f"Published to the model registry {MODEL_REGISTRY_DIR}{pointer}")
+
+
+def train_streaming():
+    """
+    Train without loading DATA_PATH into memory (see STREAMING).
+    """
+    print("Streaming data in chunks...")
+
+    def training_chunks():
+        return read_chunks(DATA_PATH, TARGET, STREAM_CHUNK_SIZE, holdout=K_FOLDS)
+
+    start_time = time.time()
+    final_model = grow_streaming_tree(
+        training_chunks, STREAM_MAX_DEPTH, STREAM_MIN_SIZE, max_bins=MAX_BINS or 255
+    )
+    training_seconds = time.time() - start_time
+    print(f"Training completed in {training_seconds:.2f} seconds")
 
-    return best_params
+    # ---------------- EVALUATION ----------------
+    compiled_model = compile_model(final_model)
+    counts = np.zeros(4, dtype=np.int64)
+    for X_test, y_test in read_chunks(DATA_PATH, TARGET, STREAM_CHUNK_SIZE, holdout=K_FOLDS, train=False):
+        test_preds = (compiled_model.predict_batch(X_test) >= THRESHOLD).astype(int)
+        counts += confusion_counts(y_test, test_preds)
+
+    te_acc, te_prec, te_rec, te_f1 = metrics_from_counts(*counts)
+
+    print("\n HOLDOUT RESULTS")
+    print(f"Accuracy        {te_acc:.4f}")
+    print(f"Precision       {te_prec:.4f}")
+    print(f"Recall          {te_rec:.4f}")
+    print(f"F1 Score        {te_f1:.4f}")
+
+    metrics = {"test": {"accuracy": te_acc, "precision": te_prec, "recall": te_rec, "f1": te_f1}}
+    save_model(
+        final_model,
+        metrics=metrics,
+        params={"max_depth": STREAM_MAX_DEPTH, "min_size": STREAM_MIN_SIZE, "max_bins": MAX_BINS or 255},
+        report=metrics_report(final_model, counts, metrics, [], training_seconds),
+    )
 
 
 def main():
-    print("Loading data...")
+    if STREAMING:
+        return train_streaming()
 
-    df = pd.read_csv(DATA_PATH)
-    df.columns = df.columns.str.lower().str.strip()
-    df = df.loc[:, ~df.columns.str.contains("^unnamed")]
+    print("Loading data...")
 
-    X = df.drop(columns=[TARGET, "id"], errors="ignore").values
-    y = df[TARGET].values
+    # Memory-mapped from the binary cache; rebuilt only when the CSV changes
+    X, y, _ = load_dataset(DATA_PATH, TARGET)
 
     print(f" Total Samples: {len(X)}")
     print(f" Total Features: {X.shape[1]}")
 
     # ---------------- TRAIN–TEST SPLIT ----------------
-    X_train, X_test, y_train, y_test = train_test_split(
-        X,
-        y,
-        test_size=0.2,
-        stratify=y,
-        random_state=RANDOM_STATE
-    )
+    X_train, X_test, y_train, y_test = split_holdout(X, y)
 
     print("Train–Test Split Completed")
 
     # ---------------- CROSS VALIDATION ----------------
-    best_depth, best_min_size = cross_validate(X_train, y_train)
+    (best_depth, best_min_size), cv_results = cross_validate(X_train, y_train)
 
     # ---------------- FINAL TRAINING ----------------
     print("\n Training Final Model with Best Hyperparameters...")
     train_data = np.column_stack((X_train, y_train))
 
     start_time = time.time()
-    final_tree = build_tree(train_data, best_depth, best_min_size)
-    print(f"Training completed in {time.time() - start_time:.2f} seconds")
+    if MODEL_TYPE == "forest":
+        final_model = build_forest(
+            train_data, N_TREES, best_depth, best_min_size, max_bins=MAX_BINS,
+            max_features=MAX_FEATURES, n_jobs=N_JOBS, random_state=RANDOM_STATE
+        )
+    else:
+        final_model = build_tree(
+            train_data, best_depth, best_min_size, max_bins=MAX_BINS, n_jobs=N_JOBS
+        )
+    training_seconds = time.time() - start_time
+    print(f"Training completed in {training_seconds:.2f} seconds")
 
     # ---------------- EVALUATION ----------------
-    train_probs = np.array([predict(final_tree, row) for row in X_train])
-    test_probs = np.array([predict(final_tree, row) for row in X_test])
-
-    train_preds = (train_probs >= THRESHOLD).astype(int)
-    test_preds = (test_probs >= THRESHOLD).astype(int)
-
-    tr_acc, tr_prec, tr_rec, tr_f1 = calculate_metrics(y_train, train_preds)
-    te_acc, te_prec, te_rec, te_f1 = calculate_metrics(y_test, test_preds)
+    metrics, test_counts = evaluate(compile_model(final_model), X_train, y_train, X_test, y_test)
+    tr_acc, tr_prec, tr_rec, tr_f1 = metrics["train"].values()
+    te_acc, te_prec, te_rec, te_f1 = metrics["test"].values()
 
     print("\n FINAL RESULTS")
     print(f"{'Metric':<15} {'Train':<10} {'Test':<10}")
@@ -140,11 +491,15 @@ def main():
     print("-" * 35)
 
     # ---------------- SAVE MODEL ----------------
-    os.makedirs("models", exist_ok=True)
-    with open("models/cardio_model.pkl", "wb") as f:
-        pickle.dump(final_tree, f)
-
-    print("\n✅ Best model saved to models/cardio_model.pkl")
+    params = {"max_depth": best_depth, "min_size": best_min_size, "max_bins": MAX_BINS}
+    if MODEL_TYPE == "forest":
+        params.update(n_trees=N_TREES, max_features=MAX_FEATURES)
+    save_model(
+        final_model,
+        metrics=metrics,
+        params=params,
+        report=metrics_report(final_model, test_counts, metrics, cv_results, training_seconds),
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,130 @@
+import os
+import queue
+import threading
+import time
+
+
+class WriteBehindQueue:
+    """
+    Collects rows on a bounded queue and hands them to `flush(rows)` in
+    batches from a background thread: as soon as `max_batch` rows are
+    waiting, or `max_delay` seconds after the oldest one arrived. `put`
+    blocks only when `max_queue` rows are already waiting.
+
+    If a batch fails, `flush_one(row)` is tried for each of its rows so one
+    bad row cannot lose the others; rows that still fail are counted and
+    reported.
+    """
+
+    def __init__(self, flush, flush_one=None, max_batch=500, max_delay=0.5, max_queue=100_000):
+        self.flush_rows = flush
+        self.flush_one = flush_one
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.batches = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        self.last_flush_seconds = None
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Started on first use in each process: threads do not survive a fork
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=self.max_queue)
+                    self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                    self._thread.start()
+                    self._pid = os.getpid()
+
+    def put(self, row):
+        if self._closed.is_set():
+            raise RuntimeError("write-behind queue is closed")
+        self._ensure_thread()
+        self._queue.put(row)
+
+    def _take_batch(self):
+        """
+        Block for the first row, then gather more until the batch is full
+        or the first row has waited max_delay. Returns [] once closed and empty.
+        """
+        while True:
+            try:
+                first = self._queue.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if self._closed.is_set():
+                    return []
+
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        written = len(batch)
+        try:
+            self.flush_rows(batch)
+        except Exception as e:
+            print(f"Write-behind flush of {len(batch)} rows failed ({e}), retrying row by row")
+            written = 0
+            for row in batch:
+                try:
+                    if self.flush_one is None:
+                        raise e
+                    self.flush_one(row)
+                    written += 1
+                except Exception as row_error:
+                    print(f"Write-behind dropped a row: {row_error}")
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.rows_written += written
+            self.rows_failed += len(batch) - written
+            self.batches += 1
+            self.flush_seconds_total += elapsed
+            self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+            self.last_flush_seconds = elapsed
+
+    def close(self, timeout=10):
+        """
+        Stop accepting rows and wait for everything queued to be written.
+        """
+        self._closed.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "queueDepth": self._queue.qsize(),
+                "maxBatch": self.max_batch,
+                "maxDelaySeconds": self.max_delay,
+                "rowsWritten": self.rows_written,
+                "rowsFailed": self.rows_failed,
+                "batches": self.batches,
+                "meanBatchSize": (self.rows_written + self.rows_failed) / self.batches if self.batches else 0.0,
+                "lastFlushSeconds": self.last_flush_seconds,
+                "meanFlushSeconds": self.flush_seconds_total / self.batches if self.batches else None,
+                "maxFlushSeconds": self.flush_seconds_max,
+            }